@@ -0,0 +1,28 @@
+"""baseline: schema as it existed before migrations were introduced
+
+Revision ID: 0001_baseline
+Revises:
+Create Date: 2026-10-17 09:00:00
+
+The core tables (userprofile, userauthentication, nutritionist, otp, ...) were
+created outside this repo. Existing databases are marked with
+`alembic stamp 0001_baseline` and then upgraded normally.
+"""
+from typing import Sequence, Union
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0001_baseline"
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    pass
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    pass
@@ -0,0 +1,39 @@
+"""user_login_activity rollup table
+
+Revision ID: 0002_user_login_activity
+Revises: 0001_baseline
+Create Date: 2026-10-17 09:10:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0002_user_login_activity"
+down_revision: Union[str, Sequence[str], None] = "0001_baseline"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # The backfill script may already have created the table
+    if sa.inspect(op.get_bind()).has_table("user_login_activity"):
+        return
+    op.create_table(
+        "user_login_activity",
+        sa.Column("userid", sa.Integer(), sa.ForeignKey("userprofile.userid", ondelete="CASCADE"), nullable=False),
+        sa.Column("activity_date", sa.Date(), nullable=False),
+        sa.Column("hour", sa.SmallInteger(), nullable=False),
+        sa.Column("login_count", sa.Integer(), nullable=False),
+        sa.Column("last_login_time", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("userid", "activity_date", "hour"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("user_login_activity")
@@ -0,0 +1,53 @@
+"""composite indexes for the routers' hot query paths
+
+Revision ID: 0003_hot_path_indexes
+Revises: 0002_user_login_activity
+Create Date: 2026-10-17 09:20:00
+
+Built CONCURRENTLY so large tables stay writable while the indexes build.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0003_hot_path_indexes"
+down_revision: Union[str, Sequence[str], None] = "0002_user_login_activity"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# (index name, table, columns) - keep in sync with the models' __table_args__
+INDEXES = [
+    # login history per client, newest first (rollup backfill, last login)
+    ("ix_user_login_history_userid_login_time", "user_login_history", ["userid", "login_time"]),
+    # /sleep-log/summary range scans and /sleep-log/latest
+    ("ix_sleep_log_userid_start_time", "sleep_log", ["userid", "start_time"]),
+    ("ix_sleep_log_userid_end_time", "sleep_log", ["userid", "end_time"]),
+    # /weight-log/logs: per user by day, latest entry of the day first
+    ("ix_user_weight_log_userid_entry_date", "user_weight_log", ["userid", "entry_date", "created_at"]),
+    # nutritionist -> clients, and client -> nutritionist (/auth/me)
+    ("ix_client_nutritionist_referral_nutritionist_id", "client_nutritionist_referral", ["nutritionist_id", "userid"]),
+    ("ix_client_nutritionist_referral_userid", "client_nutritionist_referral", ["userid"]),
+    # OTP verification lookups
+    ("ix_otp_username_otp_code", "otp", ["username", "otp_code"]),
+    # login / signup existence checks and /auth/me
+    ("ix_userauthentication_loginid", "userauthentication", ["loginid"]),
+    ("ix_userprofile_userauthenticationid", "userprofile", ["userauthenticationid"]),
+    ("ix_userprofile_email", "userprofile", ["email"]),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
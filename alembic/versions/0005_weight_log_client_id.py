@@ -0,0 +1,45 @@
+"""idempotency key for bulk weight-log imports
+
+Revision ID: 0005_weight_log_client_id
+Revises: 0003_hot_path_indexes
+Create Date: 2026-10-17 12:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0005_weight_log_client_id"
+down_revision: Union[str, Sequence[str], None] = "0003_hot_path_indexes"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Nullable, so existing rows and single-entry logs are unaffected
+    op.add_column("user_weight_log", sa.Column("client_id", sa.String(64), nullable=True))
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "uq_user_weight_log_userid_client_id",
+            "user_weight_log",
+            ["userid", "client_id"],
+            unique=True,
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "uq_user_weight_log_userid_client_id",
+            table_name="user_weight_log",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+    op.drop_column("user_weight_log", "client_id")
@@ -0,0 +1,38 @@
+"""chat_message table for persisted Socket.IO messages
+
+Revision ID: 0006_chat_message
+Revises: 0005_weight_log_client_id
+Create Date: 2026-10-17 13:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0006_chat_message"
+down_revision: Union[str, Sequence[str], None] = "0005_weight_log_client_id"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "chat_message",
+        sa.Column("id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("room", sa.String(100), nullable=False),
+        sa.Column("sender_id", sa.String(50), nullable=False),
+        sa.Column("receiver_id", sa.String(50), nullable=True),
+        sa.Column("text", sa.Text(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("chat_message")
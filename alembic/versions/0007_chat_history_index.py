@@ -0,0 +1,42 @@
+"""keyset index for chat history pages
+
+Revision ID: 0007_chat_history_index
+Revises: 0006_chat_message
+Create Date: 2026-10-17 14:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0007_chat_history_index"
+down_revision: Union[str, Sequence[str], None] = "0006_chat_message"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_chat_message_room_created_at_id",
+            "chat_message",
+            ["room", "created_at", "id"],
+            postgresql_include=["sender_id"],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_chat_message_room_created_at_id",
+            table_name="chat_message",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
@@ -0,0 +1,33 @@
+"""user_last_seen table for chat presence
+
+Revision ID: 0008_user_last_seen
+Revises: 0007_chat_history_index
+Create Date: 2026-10-17 15:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0008_user_last_seen"
+down_revision: Union[str, Sequence[str], None] = "0007_chat_history_index"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "user_last_seen",
+        sa.Column("participant_id", sa.String(20), nullable=False),
+        sa.Column("last_seen_at", sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint("participant_id"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("user_last_seen")
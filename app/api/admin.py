@@ -0,0 +1,85 @@
+# Operational endpoints - live runtime stats for the backend process
+
+import secrets
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import PlainTextResponse
+
+from app.config import settings
+from app.core.cache import analytics_cache
+from app.core.coalesce import request_coalescer
+from app.core.email import otp_mailer
+from app.core.message_buffer import chat_buffer
+from app.core.metrics import render_prometheus
+from app.core.presence import presence, typing_throttle
+from app.core.receipts import receipt_buffer
+from app.db.database import engine
+from app.db.pool import pool_status
+
+router = APIRouter(prefix="/api/admin", tags=["Admin"])
+# Scraped at the conventional /metrics path
+metrics_router = APIRouter(tags=["Admin"])
+
+
+def _require_admin(x_admin_token: str | None = Header(None)):
+    """Guard admin endpoints; they do not exist unless ADMIN_TOKEN is configured"""
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if x_admin_token is None or not secrets.compare_digest(x_admin_token.encode(), settings.ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+
+# ✅ Live connection pool usage
+@router.get("/db-pool", dependencies=[Depends(_require_admin)])
+async def get_db_pool_status():
+    return pool_status(engine.pool)
+
+
+# ✅ OTP email delivery queue
+@router.get("/mail-queue", dependencies=[Depends(_require_admin)])
+async def get_mail_queue_status():
+    return otp_mailer.stats()
+
+
+# ✅ Nutritionist dashboard cache hit / miss counters
+@router.get("/cache", dependencies=[Depends(_require_admin)])
+async def get_cache_status():
+    return analytics_cache.stats()
+
+
+# ✅ Coalesced duplicate requests on the sleep / weight read endpoints
+@router.get("/coalescing", dependencies=[Depends(_require_admin)])
+async def get_coalescing_status():
+    return request_coalescer.stats()
+
+
+# ✅ Chat write-behind buffer depth and flush counters
+@router.get("/chat-buffer", dependencies=[Depends(_require_admin)])
+async def get_chat_buffer_status():
+    return chat_buffer.stats()
+
+
+# ✅ Chat presence on this worker, broadcast / last-seen write counters
+@router.get("/presence", dependencies=[Depends(_require_admin)])
+async def get_presence_status():
+    return {**presence.stats(), "typing_suppressed": typing_throttle.suppressed}
+
+
+# ✅ Delivered / seen acks merged into watermark upserts
+@router.get("/receipts", dependencies=[Depends(_require_admin)])
+async def get_receipt_status():
+    return receipt_buffer.stats()
+
+
+# ✅ Prometheus scrape: per-route latency / SQL histograms and the stats above
+@metrics_router.get("/metrics", response_class=PlainTextResponse, dependencies=[Depends(_require_admin)])
+async def get_metrics():
+    return render_prometheus({
+        "db_pool": pool_status(engine.pool),
+        "mail_queue": otp_mailer.stats(),
+        "cache": analytics_cache.stats(),
+        "coalescing": request_coalescer.stats(),
+        "chat_buffer": chat_buffer.stats(),
+        "presence": {**presence.stats(), "typing_suppressed": typing_throttle.suppressed},
+        "receipts": receipt_buffer.stats(),
+    })
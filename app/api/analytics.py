@@ -3,91 +3,131 @@
 # Provide upcoming birthdays of clients
 # Provide last login timestamps of clients
 
+import logging
 from datetime import date, datetime, timedelta
-from fastapi import APIRouter, Depends, HTTPException, Header, Request
-from sqlalchemy.orm import Session
-from sqlalchemy import extract, func, text
-from jose import jwt, JWTError
-from app.db.database import SessionLocal
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import JSON, text
+from app.db.database import get_db
 
-from app.models.referral import ClientNutritionistReferral
-from app.models.userProfile import UserProfile
-from app.models.user_login_history import UserLoginHistory
+from app.models.userProfile import BIRTHDAY_KEY_SQL
 from app.schemas.referral import (
     NutritionistClientsWithAnalyticsResponse,
     UpcomingBirthdaysResponse,
 )
-from app.config import settings
+from app.core.cache import analytics_cache, nutritionist_owner
+from app.core.security import Principal, require_nutritionist
 
-router = APIRouter(prefix="/nutritionist/clients", tags=["Nutritionist Analytics"])
-
-ALGORITHM = "HS256"
-SECRET_KEY = settings.SECRET_KEY
-
-
-# ✅ Database session dependency
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+logger = logging.getLogger(__name__)
 
-
-def _decode_token(token: str) -> dict:
-    """Decode JWT token using jose library"""
-    try:
-        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-    except JWTError:
-        raise HTTPException(status_code=401, detail="Invalid token")
-
-
-def _get_token_payload(request: Request) -> dict:
-    """Extract and decode token from Authorization header"""
-    auth_header = request.headers.get("authorization") or request.headers.get("Authorization")
-    if not auth_header or not auth_header.lower().startswith("bearer "):
-        raise HTTPException(status_code=401, detail="Missing bearer token")
-    token = auth_header.split(" ", 1)[1].strip()
-    return _decode_token(token)
+router = APIRouter(prefix="/nutritionist/clients", tags=["Nutritionist Analytics"])
 
 
-def _require_nutritionist(payload: dict) -> int:
-    """Extract nutritionist_id from token payload"""
-    nutritionist_id = payload.get("nutritionist_id")
-    if not nutritionist_id:
-        raise HTTPException(status_code=401, detail="Invalid token: nutritionist_id missing")
-    return int(nutritionist_id)
+# Every login-derived number on the dashboard comes from a single pass over the
+# clients' rows in the user_login_activity rollup (per user/day/hour counts kept
+# up to date by verify_login_otp), so the cost no longer grows with raw history.
+_LAST_LOGIN_DASHBOARD_QUERY = text("""
+    WITH client_ids AS (
+        SELECT userid
+        FROM client_nutritionist_referral
+        WHERE nutritionist_id = :nutritionist_id
+    ),
+    activity AS (
+        SELECT userid, activity_date, hour, login_count, last_login_time
+        FROM user_login_activity
+        WHERE userid IN (SELECT userid FROM client_ids)
+    ),
+    roster AS (
+        SELECT p.userid, p.name, p.email, p.mobile, MAX(a.last_login_time) AS last_login
+        FROM userprofile p
+        LEFT JOIN activity a ON a.userid = p.userid
+        WHERE p.userid IN (SELECT userid FROM client_ids)
+        GROUP BY p.userid
+    ),
+    overview AS (
+        -- a bucket's last_login_time is its newest login, so comparing it to the
+        -- cut-off is exact rather than rounded to the hour
+        SELECT
+            COUNT(DISTINCT userid) FILTER (WHERE activity_date = :today) AS daily_active,
+            COUNT(DISTINCT userid) FILTER (WHERE last_login_time >= :seven_days_ago) AS weekly_active,
+            COUNT(DISTINCT userid) FILTER (WHERE last_login_time >= :thirty_days_ago) AS monthly_retention
+        FROM activity
+    ),
+    weekdays AS (
+        SELECT EXTRACT(DOW FROM activity_date)::int AS day, SUM(login_count)::int AS login_count
+        FROM activity
+        GROUP BY day
+    ),
+    peak AS (
+        SELECT (hour / 2) * 2 AS hour_start, SUM(login_count)::int AS login_count
+        FROM activity
+        GROUP BY hour_start
+        ORDER BY login_count DESC
+        LIMIT 1
+    )
+    SELECT
+        (SELECT COUNT(*) FROM client_ids) AS total_clients,
+        (
+            SELECT json_agg(json_build_object(
+                'userid', userid, 'name', name, 'email', email,
+                'mobile', mobile, 'last_login', last_login
+            ))
+            FROM roster
+        ) AS clients,
+        overview.daily_active,
+        overview.weekly_active,
+        overview.monthly_retention,
+        (
+            SELECT json_agg(json_build_object('day', day, 'login_count', login_count) ORDER BY day)
+            FROM weekdays
+        ) AS weekdays,
+        (SELECT hour_start FROM peak) AS peak_hour_start,
+        (SELECT login_count FROM peak) AS peak_login_count
+    FROM overview
+""").columns(clients=JSON, weekdays=JSON)
 
 
 # ✅ Fetch clients & their last login with analytics
 @router.get("/last-login", response_model=NutritionistClientsWithAnalyticsResponse)
 async def get_clients_last_login(
-    request: Request,
-    db: Session = Depends(get_db),
+    principal: Principal = Depends(require_nutritionist),
+    db: AsyncSession = Depends(get_db),
 ):
     """
     Returns all clients linked to a nutritionist,
     along with their last login timestamps and engagement analytics.
     """
-    # Extract and validate token
-    payload = _get_token_payload(request)
-    nutritionist_id = _require_nutritionist(payload)
-
-    print(f"Nutritionist ID from token: {nutritionist_id}")
+    nutritionist_id = principal.nutritionist_id
 
-    # 1️⃣ Get referrals
-    referrals = (
-        db.query(ClientNutritionistReferral)
-        .filter(ClientNutritionistReferral.nutritionist_id == nutritionist_id)
-        .all()
+    # ✅ Served from the per-nutritionist cache; logins and referral changes invalidate it
+    return await analytics_cache.get_or_compute(
+        nutritionist_owner(nutritionist_id),
+        "last-login",
+        lambda: _build_last_login_dashboard(db, nutritionist_id),
     )
 
-    if not referrals:
-        return NutritionistClientsWithAnalyticsResponse(
-            nutritionist_id=nutritionist_id,
-            total_clients=0,
-            clients=[],
-            analytics={
+
+async def _build_last_login_dashboard(db: AsyncSession, nutritionist_id: int) -> dict:
+    # ✅ One round trip: roster, overview, weekday and peak-hour numbers
+    now = datetime.now()
+    row = (
+        await db.execute(
+            _LAST_LOGIN_DASHBOARD_QUERY,
+            {
+                "nutritionist_id": nutritionist_id,
+                "today": now.date(),
+                "seven_days_ago": now - timedelta(days=7),
+                "thirty_days_ago": now - timedelta(days=30),
+            },
+        )
+    ).one()
+
+    if not row.total_clients:
+        return {
+            "nutritionist_id": nutritionist_id,
+            "total_clients": 0,
+            "clients": [],
+            "analytics": {
                 "overview": [
                     {"label": "Daily Active", "value": 0},
                     {"label": "Weekly Active", "value": 0},
@@ -96,115 +136,30 @@ async def get_clients_last_login(
                 "hourlyBreakdown": [],
                 "peakHours": {"range": None, "login_count": 0},
             },
-            msg="No referrals found for this nutritionist."
-        )
-
-    client_ids = [r.userid for r in referrals]
-
-    # 2️⃣ Fetch user + last login using MAX(login_time)
-    subquery = (
-        db.query(
-            UserLoginHistory.userid,
-            func.max(UserLoginHistory.login_time).label("last_login")
-        )
-        .filter(UserLoginHistory.userid.in_(client_ids))
-        .group_by(UserLoginHistory.userid)
-        .subquery()
-    )
-
-    # 3️⃣ Join with user profile
-    clients = (
-        db.query(UserProfile, subquery.c.last_login)
-        .join(subquery, UserProfile.userid == subquery.c.userid, isouter=True)
-        .filter(UserProfile.userid.in_(client_ids))
-        .all()
-    )
-
-    # 4️⃣ Map results
-    client_list = []
-    for c in clients:
-        if hasattr(c, 'UserProfile'):
-            # Result from join query
-            user = c.UserProfile
-            last_login = c.last_login
-        else:
-            # Direct UserProfile object
-            user = c
-            last_login = None
-        
-        client_list.append({
-            "userid": user.userid,
-            "name": user.name,
-            "email": user.email,
-            "mobile": user.mobile,
-            "lastLogin": last_login.isoformat() if last_login else None,
-        })
-
-    # ✅ Compute analytics stats from login history
-    seven_days_ago = datetime.now() - timedelta(days=7)
-    thirty_days_ago = datetime.now() - timedelta(days=30)
-
-    total_clients = len(client_ids)
-
-    # Count how many unique clients logged in recently
-    daily_active = (
-        db.query(func.count(func.distinct(UserLoginHistory.userid)))
-        .filter(
-            UserLoginHistory.userid.in_(client_ids),
-            func.date(UserLoginHistory.login_time) == datetime.now().date()
-        )
-        .scalar() or 0
-    )
+            "msg": "No referrals found for this nutritionist.",
+        }
 
-    weekly_active = (
-        db.query(func.count(func.distinct(UserLoginHistory.userid)))
-        .filter(
-            UserLoginHistory.userid.in_(client_ids),
-            UserLoginHistory.login_time >= seven_days_ago
-        )
-        .scalar() or 0
-    )
+    client_list = [
+        {
+            "userid": c["userid"],
+            "name": c["name"],
+            "email": c["email"],
+            "mobile": c["mobile"],
+            "lastLogin": c["last_login"],
+        }
+        for c in row.clients or []
+    ]
 
-    monthly_retention = (
-        db.query(func.count(func.distinct(UserLoginHistory.userid)))
-        .filter(
-            UserLoginHistory.userid.in_(client_ids),
-            UserLoginHistory.login_time >= thirty_days_ago
-        )
-        .scalar() or 0
-    )
-
-    # Compute logins per weekday (Mon, Tue, ...)
-    weekday_counts = (
-        db.query(
-            extract("dow", UserLoginHistory.login_time).label("day"),
-            func.count().label("count")
-        )
-        .filter(UserLoginHistory.userid.in_(client_ids))
-        .group_by("day")
-        .order_by("day")
-        .all()
-    )
+    total_clients = row.total_clients
+    daily_active = row.daily_active
+    weekly_active = row.weekly_active
+    monthly_retention = row.monthly_retention
 
     weekday_map = ["Sun", "Mon", "Tue", "Wed", "Thu", "Fri", "Sat"]
     hourly_breakdown = [
-        {"label": weekday_map[int(d)], "value": count} for d, count in weekday_counts
+        {"label": weekday_map[w["day"]], "value": w["login_count"]} for w in row.weekdays or []
     ]
 
-    # 6️⃣ ✅ Single peak hour range (2-hour window)
-    peak_hour_query = text("""
-        SELECT
-            FLOOR(EXTRACT(HOUR FROM login_time) / 2) * 2 AS hour_start,
-            COUNT(*) AS login_count
-        FROM user_login_history
-        WHERE userid = ANY(:client_ids)
-        GROUP BY hour_start
-        ORDER BY login_count DESC
-        LIMIT 1
-    """)
-
-    peak_result = db.execute(peak_hour_query, {"client_ids": client_ids}).fetchone()
-
     def format_hour_range(hour_start):
         hour_end = (hour_start + 2) % 24
         def format_ampm(h):
@@ -213,16 +168,18 @@ async def get_clients_last_login(
             return f"{hour_12}{ampm}"
         return f"{format_ampm(hour_start)}–{format_ampm(hour_end)}"
 
-    if peak_result:
+    if row.peak_hour_start is not None:
         peak_hours = {
-            "range": format_hour_range(int(peak_result.hour_start)),
-            "login_count": peak_result.login_count
+            "range": format_hour_range(row.peak_hour_start),
+            "login_count": row.peak_login_count
         }
     else:
         peak_hours = {"range": None, "login_count": 0}
 
-    print(f"Client list: {client_list}")
-    print(f"Analytics - Daily: {daily_active}, Weekly: {weekly_active}, Monthly: {monthly_retention}")
+    logger.debug(
+        "Client analytics computed",
+        extra={"nutritionist_id": nutritionist_id, "clients": len(client_list), "daily_active": daily_active, "weekly_active": weekly_active},
+    )
 
     # ✅ Final response payload (frontend-ready)
     return {
@@ -241,68 +198,78 @@ async def get_clients_last_login(
     }
 
 
+# Birthdays in the next :days days, window built in SQL: one MMDD key per day
+# from :today (plus 229 on Feb 28 of non-leap years, so Feb 29 birthdays are
+# celebrated then), each key kept at its nearest offset when the window spans
+# more than a year. The plan starts from the nutritionist's roster
+# (ix_client_nutritionist_referral_nutritionist_id), reads those profiles by
+# primary key and matches their keys against the window in a hash join.
+_UPCOMING_BIRTHDAYS_QUERY = text(f"""
+    WITH window_days AS (
+        SELECT g.n AS days_remaining, CAST(:today AS date) + g.n AS day
+        FROM generate_series(0, :days) AS g(n)
+    ),
+    upcoming AS (
+        SELECT k.birthday_key, MIN(d.days_remaining) AS days_remaining
+        FROM window_days d
+        CROSS JOIN LATERAL (VALUES
+            (EXTRACT(MONTH FROM d.day) * 100 + EXTRACT(DAY FROM d.day)),
+            (CASE WHEN EXTRACT(MONTH FROM d.day) = 2 AND EXTRACT(DAY FROM d.day) = 28
+                       AND EXTRACT(MONTH FROM d.day + 1) = 3
+                  THEN 229 END)
+        ) AS k(birthday_key)
+        WHERE k.birthday_key IS NOT NULL
+        GROUP BY k.birthday_key
+    )
+    SELECT p.userid, p.name, p.email, p.mobile, p.birthdate, CAST(u.days_remaining AS int) AS days_remaining
+    FROM client_nutritionist_referral r
+    JOIN userprofile p ON p.userid = r.userid
+    JOIN upcoming u ON {BIRTHDAY_KEY_SQL} = u.birthday_key
+    WHERE r.nutritionist_id = :nutritionist_id
+    ORDER BY u.days_remaining, p.name
+""")
+
+
 @router.get("/upcoming-birthdays", response_model=UpcomingBirthdaysResponse)
 async def get_upcoming_birthdays(
-    request: Request,
-    db: Session = Depends(get_db),
+    principal: Principal = Depends(require_nutritionist),
+    days: int = Query(7, ge=0, le=366, description="Window size in days from today"),
+    db: AsyncSession = Depends(get_db),
 ):
     """
-    Returns clients with birthdays in the next 7 days.
+    Returns clients with birthdays in the next `days` days (default 7).
     """
-    # Extract and validate token
-    payload = _get_token_payload(request)
-    nutritionist_id = _require_nutritionist(payload)
-    
-    today = date.today()
+    nutritionist_id = principal.nutritionist_id
 
-    # Fetch linked client IDs for the given nutritionist
-    client_ids = (
-        db.query(ClientNutritionistReferral.userid)
-        .filter(ClientNutritionistReferral.nutritionist_id == nutritionist_id)
-        .all()
+    # days_remaining shifts at midnight, so the cache entry is per day
+    today = date.today()
+    return await analytics_cache.get_or_compute(
+        nutritionist_owner(nutritionist_id),
+        f"upcoming-birthdays:{today.isoformat()}:{days}",
+        lambda: _build_upcoming_birthdays(db, nutritionist_id, today, days),
     )
-    client_ids = [c[0] for c in client_ids]
-
-    if not client_ids:
-        return {"nutritionist_id": nutritionist_id, "total_upcoming_birthdays": 0, "upcoming_birthdays": []}
 
-    # Fetch clients
-    clients = db.query(
-        UserProfile.userid,
-        UserProfile.name,
-        UserProfile.email,
-        UserProfile.mobile,
-        UserProfile.birthdate
-    ).filter(UserProfile.userid.in_(client_ids)).all()
 
-    upcoming_birthdays = []
-    for c in clients:
-        if not c.birthdate:
-            continue
-            
-        bday = c.birthdate
-        # Normalize birthday to this year
-        this_year_bday = bday.replace(year=today.year)
-
-        # If birthday has passed this year, move to next year
-        if this_year_bday < today:
-            this_year_bday = this_year_bday.replace(year=today.year + 1)
-
-        days_remaining = (this_year_bday - today).days
-
-        # ✅ Include all birthdays within next 7 days
-        if 0 <= days_remaining <= 7:
-            upcoming_birthdays.append({
-                "userid": c.userid,
-                "name": c.name,
-                "email": c.email,
-                "mobile": c.mobile,
-                "birthdate": c.birthdate.isoformat() if c.birthdate else None,
-                "days_remaining": days_remaining
-            })
-
-    # ✅ Sort by days_remaining so nearest birthdays appear first
-    upcoming_birthdays.sort(key=lambda x: x["days_remaining"])
+async def _build_upcoming_birthdays(db: AsyncSession, nutritionist_id: int, today: date, days: int) -> dict:
+    rows = (
+        await db.execute(
+            _UPCOMING_BIRTHDAYS_QUERY,
+            {"today": today, "days": days, "nutritionist_id": nutritionist_id},
+        )
+    ).all()
+
+    # ✅ Already sorted by days_remaining so nearest birthdays appear first
+    upcoming_birthdays = [
+        {
+            "userid": r.userid,
+            "name": r.name,
+            "email": r.email,
+            "mobile": r.mobile,
+            "birthdate": r.birthdate.isoformat(),
+            "days_remaining": r.days_remaining,
+        }
+        for r in rows
+    ]
 
     return {
         "nutritionist_id": nutritionist_id,
@@ -1,22 +1,28 @@
 from datetime import datetime, timedelta
+import logging
 import random
 from app.models.nutritionist import Nutritionist
 from app.models.referral import ClientNutritionistReferral
 from fastapi import APIRouter, Request, HTTPException, Depends, BackgroundTasks, status
-from fastapi.security import OAuth2PasswordBearer
 from fastapi.responses import JSONResponse
-from sqlalchemy.orm import Session
-from app.db.database import SessionLocal
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.database import get_db
 from app.models.user_authentication import UserAuthentication
 from app.models.userProfile import Client
 from app.config import settings
-from app.core.email import send_otp_email
+from app.core.email import MailQueueFull, send_otp_email
 from app.models.user import OTP
 from app.schemas.auth import *
 from app.models.user_login_history import UserLoginHistory
-from app.core.security import create_access_token, decode_access_token
+from app.utils.login_activity import record_login_activity
+from app.core.cache import invalidate_nutritionists
+from app.core.chat_auth import invalidate_chat_rooms
+from app.core.security import Principal, create_access_token, get_current_principal
 
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(prefix="/auth", tags=["auth"])
 
 # Secret key for JWT from settings
@@ -24,21 +30,12 @@ SECRET_KEY = settings.SECRET_KEY
 ALGORITHM = "HS256"
 
 
-# Dependency to get DB session
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
 # Utility to generate OTP
 def generate_otp():
     return str(random.randint(100000, 999999))
 
 @router.post("/signup")
-async def signup(request: Request, db: Session = Depends(get_db)):
+async def signup(request: Request, db: AsyncSession = Depends(get_db)):
     """
     Step 1: Send OTP to email for verification.
     Only accepts email, does NOT create any user records yet.
@@ -50,10 +47,10 @@ async def signup(request: Request, db: Session = Depends(get_db)):
         raise HTTPException(status_code=400, detail='Email is required')
     
     # Check if user already exists
-    if db.query(UserAuthentication).filter_by(loginid=email).first():
+    if await db.scalar(select(UserAuthentication).filter_by(loginid=email)):
         raise HTTPException(status_code=400, detail='User already exists')
     
-    if db.query(Client).filter_by(email=email).first():
+    if await db.scalar(select(Client).filter_by(email=email)):
         raise HTTPException(status_code=400, detail='User already exists')
 
     # Generate and send OTP
@@ -61,14 +58,20 @@ async def signup(request: Request, db: Session = Depends(get_db)):
     expires_at = datetime.now() + timedelta(minutes=5)
     otp_entry = OTP(username=email, otp_code=otp_code, expires_at=expires_at)
     db.add(otp_entry)
-    db.commit()
+    await db.flush()
 
-    send_otp_email(email, otp_code, subject="Your Signup OTP")
+    # Queue the email before committing, so a full queue leaves no orphaned OTP row
+    try:
+        send_otp_email(email, otp_code, subject="Your Signup OTP")
+    except MailQueueFull:
+        await db.rollback()
+        raise HTTPException(status_code=503, detail='OTP service busy, please retry shortly')
+    await db.commit()
     return {"msg": "OTP sent to email", "email": email}
 
 
 @router.post("/verify-signup-otp")
-async def verify_signup_otp(request: Request, db: Session = Depends(get_db)):
+async def verify_signup_otp(request: Request, db: AsyncSession = Depends(get_db)):
     """
     Step 2: Verify OTP - Just marks email as verified.
     Does NOT create any database records. User profile will be created in step 3.
@@ -86,13 +89,13 @@ async def verify_signup_otp(request: Request, db: Session = Depends(get_db)):
     otp_code = verify_req.otp.strip()
 
     # Verify OTP
-    otp_entry = db.query(OTP).filter_by(username=email, otp_code=otp_code).first()
+    otp_entry = await db.scalar(select(OTP).filter_by(username=email, otp_code=otp_code))
     if not otp_entry or otp_entry.expires_at < datetime.now():
         raise HTTPException(status_code=400, detail='Invalid or expired OTP')
 
     # Clean up OTP
-    db.delete(otp_entry)
-    db.commit()
+    await db.delete(otp_entry)
+    await db.commit()
 
     # Return success - email verified (no token yet, no database records created)
     return {
@@ -104,33 +107,36 @@ async def verify_signup_otp(request: Request, db: Session = Depends(get_db)):
 
 
 @router.post("/login")
-async def login(request: Request, db: Session = Depends(get_db)):
+async def login(request: Request, db: AsyncSession = Depends(get_db)):
     data = await request.json()
     email = (data.get('email') or '').strip()
-    print("DEBUG >> login email:", email)   
     if not email:
         raise HTTPException(status_code=400, detail='Email is required')
     # Check existence via userauthentication table
-    ua = db.query(UserAuthentication).filter_by(loginid=email).first()
+    ua = await db.scalar(select(UserAuthentication).filter_by(loginid=email))
     if not ua:
         raise HTTPException(status_code=404, detail='User not found')
+    logger.debug("Login OTP requested", extra={"userauthenticationid": ua.userauthenticationid})
 
     # Generate OTP
     otp_code = generate_otp()
     expires_at = datetime.now() + timedelta(minutes=5)
     otp_entry = OTP(username=email, otp_code=otp_code, expires_at=expires_at)
     db.add(otp_entry)
-    db.commit()
+    await db.flush()
 
-    # Send OTP email
-    send_otp_email(email, otp_code, subject="Your Login OTP")
+    # Queue the email before committing, so a full queue leaves no orphaned OTP row
+    try:
+        send_otp_email(email, otp_code, subject="Your Login OTP")
+    except MailQueueFull:
+        await db.rollback()
+        raise HTTPException(status_code=503, detail='OTP service busy, please retry shortly')
+    await db.commit()
     return {"msg": "OTP sent to email"}
 
 
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
-
 @router.post("/verify-login-otp")
-async def verify_login_otp(request: Request, db: Session = Depends(get_db)):
+async def verify_login_otp(request: Request, db: AsyncSession = Depends(get_db)):
     data = await request.json()
     email = (data.get('email') or '').strip()
     otp_code = (data.get('otp') or '').strip()
@@ -139,42 +145,52 @@ async def verify_login_otp(request: Request, db: Session = Depends(get_db)):
         raise HTTPException(status_code=400, detail='Email and OTP are required')
 
     # ✅ Validate OTP
-    otp_entry = db.query(OTP).filter_by(username=email, otp_code=otp_code).first()
-    print("Printing OTP Entry:", otp_entry)
+    otp_entry = await db.scalar(select(OTP).filter_by(username=email, otp_code=otp_code))
     if not otp_entry or otp_entry.expires_at < datetime.now():
         raise HTTPException(status_code=400, detail='Invalid or expired OTP')
     
     # ✅ Locate authentication row
-    auth_record = db.query(UserAuthentication).filter_by(loginid=email).first()
-    print("Printing auth_record:", auth_record)
+    auth_record = await db.scalar(select(UserAuthentication).filter_by(loginid=email))
     if not auth_record:
         raise HTTPException(status_code=404, detail='User not found')
 
     # ✅ Get corresponding user profile
-    user_profile = db.query(Client).filter_by(userauthenticationid=auth_record.userauthenticationid).first()
-    print("Printing User Profile >>", user_profile)
+    user_profile = await db.scalar(select(Client).filter_by(userauthenticationid=auth_record.userauthenticationid))
     if not user_profile:
         raise HTTPException(status_code=404, detail='User profile not found or something else')
+    logger.debug("Login OTP verified", extra={"userid": user_profile.userid})
 
     # ✅ Get IP and user-agent safely
     ip_address = request.client.host if request.client else "unknown"
     user_agent = request.headers.get('user-agent', 'unknown')
 
-    # ✅ Record login history
+    # ✅ Record login history (+ the analytics rollup in the same transaction)
+    login_time = datetime.now()
     login_entry = UserLoginHistory(
         userid=user_profile.userid,
-        login_time=datetime.now(),
+        login_time=login_time,
         ip_address=ip_address,
         user_agent=user_agent
     )
     db.add(login_entry)
+    await record_login_activity(db, user_profile.userid, login_time)
 
     # ✅ Update last login timestamp
-    user_profile.lastlogin = datetime.now()
+    user_profile.lastlogin = login_time
 
     # ✅ Remove OTP
-    db.delete(otp_entry)
-    db.commit()
+    await db.delete(otp_entry)
+    await db.commit()
+
+    # ✅ Linked nutritionists' dashboards now show stale login analytics
+    nutritionist_ids = (
+        await db.scalars(
+            select(ClientNutritionistReferral.nutritionist_id).filter_by(userid=user_profile.userid)
+        )
+    ).all()
+    await invalidate_nutritionists(nutritionist_ids)
+    # ✅ A fresh login re-reads which chat rooms the client may join
+    invalidate_chat_rooms(userids=[user_profile.userid])
 
     # ✅ Generate JWT token
     token_data = {
@@ -194,34 +210,31 @@ async def verify_login_otp(request: Request, db: Session = Depends(get_db)):
 
 
 @router.get("/me")
-async def get_profile(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    try:
-        payload = decode_access_token(token)
-        auth_id = int(payload.get("auth_id"))
-    except Exception:
+async def get_profile(principal: Principal = Depends(get_current_principal), db: AsyncSession = Depends(get_db)):
+    auth_id = principal.auth_id
+    if auth_id is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
 
-    auth_record = db.query(UserAuthentication).filter_by(userauthenticationid=auth_id).first()
+    auth_record = await db.scalar(select(UserAuthentication).filter_by(userauthenticationid=auth_id))
     if not auth_record:
         raise HTTPException(status_code=404, detail="User not found")
 
-    user_profile = db.query(Client).filter_by(userauthenticationid=auth_id).first()
+    user_profile = await db.scalar(select(Client).filter_by(userauthenticationid=auth_id))
     if not user_profile:
         raise HTTPException(status_code=404, detail="Client not found")
     
     # Fetch linked nutritionist
-    linkage = db.query(ClientNutritionistReferral).filter_by(userid=user_profile.userid).first()
-    print("DEBUG >> linkage is:", linkage)
+    linkage = await db.scalar(select(ClientNutritionistReferral).filter_by(userid=user_profile.userid))
 
     nutritionist_id = linkage.nutritionist_id if linkage else None
-    print("DEBUG >> nutritionist_id is:", nutritionist_id)
+    logger.debug("Client profile lookup", extra={"userid": user_profile.userid, "nutritionist_id": nutritionist_id})
 
     nutritionist_data = None
 
     nutritionist = None
 
     if linkage and linkage.nutritionist_id:
-        nutritionist = db.query(Nutritionist).filter_by(nutritionistid=linkage.nutritionist_id).first()
+        nutritionist = await db.scalar(select(Nutritionist).filter_by(nutritionistid=linkage.nutritionist_id))
         if nutritionist:
             nutritionist_data = {
                 "id": nutritionist.nutritionistid,
@@ -237,8 +250,6 @@ async def get_profile(token: str = Depends(oauth2_scheme), db: Session = Depends
                 "referralcode": nutritionist.referralcode,
             }
 
-    print("DEBUG >> nutritionist_data is:", nutritionist_data)
-
 
     user_data = {
         "id": user_profile.userid,
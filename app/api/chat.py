@@ -0,0 +1,45 @@
+# Chat history for rooms persisted from Socket.IO (see app/api/socket.py)
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.chat_auth import allowed_rooms, can_access_room, participant_id
+from app.core.security import Principal, get_current_principal
+from app.db.database import get_db
+from app.utils.chat_history import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, load_history, unread_counts
+
+router = APIRouter(prefix="/chat", tags=["Chat"])
+
+
+@router.get("/unread")
+async def get_unread_counts(
+    principal: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Unread messages per room (capped at 999) counted from the caller's seen watermark.
+    """
+    participant = participant_id(principal)
+    if participant is None:
+        raise HTTPException(status_code=401, detail="Invalid token: userid or nutritionist_id missing")
+    return await unread_counts(db, participant, await allowed_rooms(principal))
+
+
+@router.get("/rooms/{room}/messages")
+async def get_room_history(
+    room: str,
+    cursor: str | None = Query(None, description="next_cursor from the previous page"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    principal: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Returns messages newest first; pass `next_cursor` back to load older ones.
+    `next_cursor` is null once the start of the room is reached.
+    """
+    if not await can_access_room(principal, room):
+        raise HTTPException(status_code=403, detail="Not allowed to read this room")
+    try:
+        return await load_history(db, room, cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
@@ -1,36 +1,40 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from datetime import datetime, timedelta
-from sqlalchemy import func
+import json
 
-from app.db.database import SessionLocal
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import date, datetime, timedelta, timezone
+from dateutil.relativedelta import relativedelta
+from sqlalchemy import insert, select, text
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from app.db.database import get_db, run_in_session
+from app.core.coalesce import request_coalescer
+from app.core.security import Principal, require_client
 from app.models.sleep_log import SleepLog
 from app.schemas.sleep_log import (
     SleepLogCreate,
     SleepLogResponse,
-    SleepSummaryResponse
+    SleepSummaryResponse,
+    SleepBatchResponse,
 )
-from app.utils.sleep import calculate_sleep_minutes
+from app.utils.downsample import BUCKETS, downsample_points, pick_bucket, resolve_range
+from app.utils.sleep import calculate_sleep_minutes, find_overlaps
 
 router = APIRouter(prefix="/sleep-log", tags=["Sleep Log"])
 
-
-# ✅ Database session dependency
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+# pg_advisory_xact_lock namespace for per-user batch ingests
+_SLEEP_BATCH_LOCK = 5101
 
 
 # Create Sleep Log
 @router.post("", response_model=SleepLogResponse)
-def create_sleep_log(
-    userid: int,
+async def create_sleep_log(
     data: SleepLogCreate,
-    db: Session = Depends(get_db)
+    principal: Principal = Depends(require_client),
+    db: AsyncSession = Depends(get_db)
 ):
+    userid = principal.userid
     duration = calculate_sleep_minutes(data.start_time, data.end_time)
 
     log = SleepLog(
@@ -43,18 +47,153 @@ def create_sleep_log(
     )
 
     db.add(log)
-    db.commit()
-    db.refresh(log)
+    await db.commit()
+    await db.refresh(log)
     return log
 
+MAX_BATCH_ITEMS = 1000
+_NDJSON_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+
+
+async def _read_batch_items(request: Request) -> list:
+    """Batch body as a list of raw items: a JSON array, or one JSON object per line for NDJSON."""
+    body = await request.body()
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+
+    if content_type in _NDJSON_TYPES:
+        try:
+            lines = body.decode("utf-8").splitlines()
+        except UnicodeDecodeError:
+            raise HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON")
+        items = []
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                items.append(json.loads(line))
+            except ValueError as e:
+                items.append(e)  # reported per item, the rest of the stream still counts
+        return items
+
+    try:
+        items = json.loads(body)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON")
+    if not isinstance(items, list):
+        raise HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON")
+    return items
+
+
+def _as_utc(value: datetime) -> datetime:
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+# Bulk ingest for wearable syncs
+@router.post("/batch", response_model=SleepBatchResponse)
+async def create_sleep_logs_batch(
+    request: Request,
+    principal: Principal = Depends(require_client),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Accepts a JSON array (or NDJSON stream) of sleep sessions.
+    Sessions overlapping another one in the batch or an already stored session
+    are skipped; the rest are inserted in one statement. Results are per item,
+    in request order.
+    """
+    userid = principal.userid
+    items = await _read_batch_items(request)
+    if len(items) > MAX_BATCH_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_ITEMS} sessions per batch")
+
+    results = [{"index": i} for i in range(len(items))]
+    valid = []  # (index, row)
+    for i, item in enumerate(items):
+        try:
+            if isinstance(item, Exception):
+                raise ValueError(f"Invalid JSON: {item}")
+            data = SleepLogCreate.model_validate(item)
+            start, end = _as_utc(data.start_time), _as_utc(data.end_time)
+            duration = calculate_sleep_minutes(start, end)
+        except ValidationError as e:
+            error = "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+            results[i].update(status="invalid", error=error)
+            continue
+        except ValueError as e:
+            results[i].update(status="invalid", error=str(e))
+            continue
+        valid.append((i, {
+            "userid": userid,
+            "start_time": start,
+            "end_time": end,
+            "duration_minutes": duration,
+            "quality": data.quality,
+            "note": data.note,
+        }))
+
+    if valid:
+        # Serialise batches per user so two concurrent syncs cannot both insert the same night
+        await db.execute(text("SELECT pg_advisory_xact_lock(:ns, :userid)"), {"ns": _SLEEP_BATCH_LOCK, "userid": userid})
+
+        existing = (
+            await db.execute(
+                select(SleepLog.start_time, SleepLog.end_time).filter(
+                    SleepLog.userid == userid,
+                    SleepLog.start_time < max(row["end_time"] for _, row in valid),
+                    SleepLog.end_time > min(row["start_time"] for _, row in valid),
+                )
+            )
+        ).all()
+        overlaps = find_overlaps(
+            [(row["start_time"], row["end_time"]) for _, row in valid],
+            [(r.start_time, r.end_time) for r in existing],
+        )
+
+        to_insert = []
+        for (i, row), overlap in zip(valid, overlaps):
+            if overlap:
+                results[i]["status"] = overlap
+            else:
+                to_insert.append((i, row))
+
+        if to_insert:
+            ids = (
+                await db.scalars(
+                    insert(SleepLog).returning(SleepLog.id, sort_by_parameter_order=True),
+                    [row for _, row in to_insert],
+                )
+            ).all()
+            for (i, _), new_id in zip(to_insert, ids):
+                results[i].update(status="created", id=new_id)
+        await db.commit()
+
+    statuses = [r["status"] for r in results]
+    return {
+        "received": len(items),
+        "created": statuses.count("created"),
+        "skipped": statuses.count("duplicate") + statuses.count("exists"),
+        "invalid": statuses.count("invalid"),
+        "results": results,
+    }
+
+
 # Get Latest Sleep Log
 @router.get("/latest")
-def get_latest_sleep(userid: int, db: Session = Depends(get_db)):
-    log = (
-        db.query(SleepLog)
+async def get_latest_sleep(principal: Principal = Depends(require_client)):
+    # Duplicate in-flight calls (e.g. screen remounts) share one query
+    userid = principal.userid
+    return await request_coalescer.run(
+        ("sleep-latest", userid),
+        lambda: run_in_session(_build_latest_sleep, userid),
+    )
+
+
+async def _build_latest_sleep(db: AsyncSession, userid: int):
+    log = await db.scalar(
+        select(SleepLog)
         .filter(SleepLog.userid == userid)
         .order_by(SleepLog.end_time.desc())
-        .first()
+        .limit(1)
     )
 
     if not log:
@@ -72,88 +211,203 @@ def get_latest_sleep(userid: int, db: Session = Depends(get_db)):
     }
 
 
+# Fixed-length summary series: one row per bucket (zero when nothing was logged),
+# each session counted on its wake date in the caller's timezone.
+_SLEEP_SUMMARY_QUERY = text("""
+    WITH buckets AS (
+        SELECT g.i,
+               CAST(CAST(:first AS date) + g.i * make_interval(months => :step_months, days => :step_days) AS date) AS bucket_start,
+               CAST(CAST(:first AS date) + (g.i + 1) * make_interval(months => :step_months, days => :step_days) AS date) AS bucket_end
+        FROM generate_series(0, :buckets - 1) AS g(i)
+    ),
+    nights AS (
+        SELECT CAST(end_time AT TIME ZONE :tz AS date) AS wake_date, duration_minutes
+        FROM sleep_log
+        WHERE userid = :userid
+          AND end_time >= CAST(:first AS timestamp) AT TIME ZONE :tz
+          AND end_time < CAST(:last AS timestamp) AT TIME ZONE :tz
+    )
+    SELECT b.bucket_start, COALESCE(SUM(n.duration_minutes), 0) AS minutes
+    FROM buckets b
+    LEFT JOIN nights n ON n.wake_date >= b.bucket_start AND n.wake_date < b.bucket_end
+    GROUP BY b.i, b.bucket_start
+    ORDER BY b.i
+""")
+
+# mode -> (bucket count, step months, step days)
+_SUMMARY_BUCKETS = {
+    "daily": (7, 0, 1),
+    "weekly": (4, 0, 7),
+    "monthly": (4, 1, 0),
+}
+
+
+def _summary_first_bucket(mode: str, today: date) -> date:
+    if mode == "daily":
+        return today - timedelta(days=6)
+    if mode == "weekly":
+        return today - timedelta(days=today.weekday(), weeks=3)  # ISO weeks, current one last
+    return today.replace(day=1) - relativedelta(months=3)
+
+
+def _summary_label(mode: str, index: int, bucket_start: date) -> str:
+    if mode == "daily":
+        return bucket_start.strftime("%a")
+    if mode == "weekly":
+        return f"Week {index + 1}"
+    return bucket_start.strftime("%b")
+
+
 # Get Sleep Summary 
 @router.get("/summary", response_model=SleepSummaryResponse)
-def get_sleep_summary(
-    userid: int,
+async def get_sleep_summary(
     mode: str = Query("daily", enum=["daily", "weekly", "monthly"]),
-    db: Session = Depends(get_db)
+    tz: str = Query("UTC", description="IANA timezone used to assign sessions to wake dates"),
+    principal: Principal = Depends(require_client),
 ):
-    now = datetime.utcnow()
+    try:
+        zone = ZoneInfo(tz)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise HTTPException(status_code=400, detail=f"Unknown timezone: {tz}")
 
-    if mode == "daily":
-        start = now - timedelta(days=6)
+    # Buckets move at local midnight, so today's date is part of the key
+    userid = principal.userid
+    today = datetime.now(zone).date()
+    return await request_coalescer.run(
+        ("sleep-summary", userid, mode, tz, today),
+        lambda: run_in_session(_build_sleep_summary, userid, mode, tz, today),
+    )
 
-        rows = (
-            db.query(
-                func.date(SleepLog.start_time).label("label"),
-                func.sum(SleepLog.duration_minutes).label("minutes")
-            )
-            .filter(
-                SleepLog.userid == userid,
-                SleepLog.start_time >= start
-            )
-            .group_by("label")
-            .order_by("label")
-            .all()
+
+async def _build_sleep_summary(db: AsyncSession, userid: int, mode: str, tz: str, today: date):
+    buckets, step_months, step_days = _SUMMARY_BUCKETS[mode]
+    first = _summary_first_bucket(mode, today)
+    last = first + relativedelta(months=step_months * buckets, days=step_days * buckets)
+
+    rows = (
+        await db.execute(
+            _SLEEP_SUMMARY_QUERY,
+            {
+                "userid": userid,
+                "tz": tz,
+                "first": first,
+                "last": last,
+                "buckets": buckets,
+                "step_months": step_months,
+                "step_days": step_days,
+            },
         )
+    ).all()
 
-        labels = [r.label.strftime("%a") for r in rows]
-        values = [r.minutes for r in rows]
+    return {
+        "mode": mode,
+        "timezone": tz,
+        "labels": [_summary_label(mode, i, r.bucket_start) for i, r in enumerate(rows)],
+        "values": [r.minutes for r in rows]
+    }
 
-    elif mode == "weekly":
-        start = now - timedelta(weeks=4)
 
-        rows = (
-            db.query(
-                func.date_trunc("week", SleepLog.start_time).label("label"),
-                func.sum(SleepLog.duration_minutes).label("minutes")
-            )
-            .filter(
-                SleepLog.userid == userid,
-                SleepLog.start_time >= start
-            )
-            .group_by("label")
-            .order_by("label")
-            .all()
-        )
+# Arbitrary-range chart: nightly totals first (by wake date in the caller's
+# timezone, as in the summary), then one row per non-empty bucket with the
+# avg / min / max nightly minutes and the bucket total
+_SLEEP_RANGE_QUERY = text("""
+    WITH nightly AS (
+        SELECT CAST(end_time AT TIME ZONE :tz AS date) AS day, SUM(duration_minutes) AS minutes
+        FROM sleep_log
+        WHERE userid = :userid
+          AND end_time >= CAST(:start AS timestamp) AT TIME ZONE :tz
+          AND end_time < CAST(:end AS timestamp) AT TIME ZONE :tz
+        GROUP BY 1
+    )
+    SELECT CAST(date_trunc(:bucket, day) AS date) AS start,
+           ROUND(AVG(minutes)) AS avg,
+           MIN(minutes) AS min,
+           MAX(minutes) AS max,
+           SUM(minutes) AS total,
+           COUNT(*) AS nights
+    FROM nightly
+    GROUP BY 1
+    ORDER BY 1
+""")
 
-        labels = [f"Week {i+1}" for i in range(len(rows))]
-        values = [r.minutes for r in rows]
 
-    else:  # monthly
-        start = now - timedelta(days=120)
+@router.get("/range")
+async def get_sleep_range(
+    from_date: date | None = Query(None, alias="from", description="First day (default: 90 days before 'to')"),
+    to_date: date | None = Query(None, alias="to", description="Last day (default: today)"),
+    bucket: str = Query("auto", enum=["auto", *BUCKETS]),
+    max_points: int = Query(200, ge=10, le=1000, description="Upper bound on returned points"),
+    tz: str = Query("UTC", description="IANA timezone used to assign sessions to wake dates"),
+    principal: Principal = Depends(require_client),
+):
+    try:
+        zone = ZoneInfo(tz)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise HTTPException(status_code=400, detail=f"Unknown timezone: {tz}")
+    try:
+        start, end = resolve_range(from_date, to_date, today=datetime.now(zone).date())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if bucket == "auto":
+        bucket = pick_bucket(start, end, max_points)
 
-        rows = (
-            db.query(
-                func.date_trunc("month", SleepLog.start_time).label("label"),
-                func.sum(SleepLog.duration_minutes).label("minutes")
-            )
-            .filter(
-                SleepLog.userid == userid,
-                SleepLog.start_time >= start
-            )
-            .group_by("label")
-            .order_by("label")
-            .all()
+    userid = principal.userid
+    return await request_coalescer.run(
+        ("sleep-range", userid, start, end, bucket, max_points, tz),
+        lambda: run_in_session(_build_sleep_range, userid, start, end, bucket, max_points, tz),
+    )
+
+
+async def _build_sleep_range(db: AsyncSession, userid: int, start: date, end: date, bucket: str, max_points: int, tz: str):
+    rows = (
+        await db.execute(
+            _SLEEP_RANGE_QUERY,
+            {
+                "userid": userid,
+                "tz": tz,
+                "start": start,
+                "end": end + timedelta(days=1),
+                "bucket": bucket,
+            },
         )
+    ).mappings().all()
 
-        labels = [r.label.strftime("%b") for r in rows]
-        values = [r.minutes for r in rows]
+    # An explicit fine bucket over a long range is reduced by LTTB on the averages
+    points = downsample_points([dict(row) for row in rows], max_points)
 
     return {
-        "mode": mode,
-        "labels": labels,
-        "values": values
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        "bucket": bucket,
+        "timezone": tz,
+        "downsampled": len(points) < len(rows),
+        "points": [
+            {
+                "start": p["start"].isoformat(),
+                "avg": int(p["avg"]),
+                "min": p["min"],
+                "max": p["max"],
+                "total": p["total"],
+                "nights": p["nights"],
+            }
+            for p in points
+        ],
     }
 
 
 @router.delete("/{sleep_id}")
-def delete_sleep_log(sleep_id: int, db: Session = Depends(get_db)):
-    log = db.query(SleepLog).filter(SleepLog.id == sleep_id).first()
+async def delete_sleep_log(
+    sleep_id: int,
+    principal: Principal = Depends(require_client),
+    db: AsyncSession = Depends(get_db)
+):
+    # Scoped to the caller, so other users' logs read as not found
+    log = await db.scalar(
+        select(SleepLog).filter(SleepLog.id == sleep_id, SleepLog.userid == principal.userid)
+    )
     if not log:
         raise HTTPException(status_code=404, detail="Sleep log not found")
 
-    db.delete(log)
-    db.commit()
+    await db.delete(log)
+    await db.commit()
     return {"message": "Sleep log deleted"}
@@ -1,84 +1,313 @@
+import logging
+import uuid
+from datetime import datetime, timezone
+
 import socketio
+from socketio.exceptions import ConnectionRefusedError
+
+from app.config import settings
+from app.core.chat_auth import can_access_room, participant_id, participant_rooms, room_participants
+from app.core.message_buffer import ChatBufferFull, chat_buffer
+from app.core.presence import presence, typing_throttle
+from app.core.security import InvalidTokenError, Principal, verify_token
+from app.db.database import run_in_session
+from app.core.receipts import receipt_buffer
+from app.utils.chat_history import (
+    DEFAULT_PAGE_SIZE,
+    MAX_PAGE_SIZE,
+    load_history as load_room_history,
+    mark_payload,
+    read_marks,
+    unread_counts as load_unread_counts,
+)
+
+logger = logging.getLogger(__name__)
+
+# Longest client_msg_id echoed back in receive_message
+CLIENT_MSG_ID_MAX_LENGTH = 64
+
+
+def _client_manager():
+    """
+    With SOCKETIO_REDIS_URL set, rooms and emits go through Redis pub/sub so every
+    worker (and node) reaches its own clients. Otherwise the default in-memory
+    manager is used, which only works with a single process.
+    """
+    if settings.SOCKETIO_REDIS_URL:
+        return socketio.AsyncRedisManager(settings.SOCKETIO_REDIS_URL, channel=settings.SOCKETIO_CHANNEL)
+    return None
+
 
 sio = socketio.AsyncServer(
     async_mode = 'asgi',
     cors_allowed_origins = '*',
+    client_manager = _client_manager(),
 )
 
 # ----------------------------
 # Socket Events
 # ----------------------------
 
+def _bearer_token(environ, auth):
+    # socket.io clients pass {"token": ...} as `auth`; other clients may send a header
+    if isinstance(auth, dict) and auth.get("token"):
+        return str(auth["token"]).removeprefix("Bearer ").strip()
+    header = environ.get("HTTP_AUTHORIZATION", "")
+    if header.lower().startswith("bearer "):
+        return header[7:].strip()
+    return None
+
+
+async def _principal(sid) -> Principal:
+    return (await sio.get_session(sid))["principal"]
+
+
+def _in_chat_room(sid, room) -> bool:
+    """True if `room` is a chat room this socket has joined (join_room authorised it).
+    sio.rooms(sid) also holds the socket's own sid room, which is not a chat room."""
+    return isinstance(room, str) and room_participants(room) is not None and room in sio.rooms(sid)
+
+
 @sio.event
 async def connect(sid, environ, auth):
-    print(f"Client connected: {sid}")
+    token = _bearer_token(environ, auth)
+    if not token:
+        raise ConnectionRefusedError("Missing token")
+    try:
+        principal = verify_token(token)
+    except InvalidTokenError:
+        raise ConnectionRefusedError("Invalid token")
+    if participant_id(principal) is None:
+        raise ConnectionRefusedError("Token has no userid or nutritionist_id")
+
+    await sio.save_session(sid, {"principal": principal})
+    presence.connected(participant_id(principal), sid)
+    logger.info("Socket connected", extra={"sid": sid, "participant": participant_id(principal)})
 
 @sio.event
 async def disconnect(sid):
-    print(f"Client disconnected: {sid}")
+    participant = participant_id(await _principal(sid))
+    for room in typing_throttle.drop_sid(sid):
+        await _emit_typing(room, participant, False, skip_sid=sid)
+    presence.disconnected(participant, sid)
+    logger.info("Socket disconnected", extra={"sid": sid, "participant": participant})
 
 @sio.event
 async def join_room(sid, room):
-    # room = data.get('room')
+    """
+    room = "chat_n{nutritionist_id}_u{userid}" - only the two linked parties may join.
+    Ack: {"status": "ok"} or {"error": ...}
+    """
+    if not isinstance(room, str) or not await can_access_room(await _principal(sid), room):
+        return {"error": "Not allowed to join this room"}
     await sio.enter_room(sid, room)
     # await sio.emit('room_joined', {'room': room}, room=sid)
-    print(f"{sid} joined room {room}")
-
-# @sio.event
-# async def send_message(sid, data):
-#     """
-#     data = {
-#         "room": "chat_u1_u2",
-#         "sender_id": "u1",
-#         "receiver_id": "u2",
-#         "text": "Hello"
-#     }
-#     """
-#     room = data["room"]
-#     await sio.emit("receive_message", data, room=room)
+    logger.debug("Socket joined room", extra={"sid": sid, "room": room})
+
+    # Current presence of the other party, so the UI can show "online" / "last seen"
+    me = participant_id(await _principal(sid))
+    other = next(p for p in room_participants(room) if p != me)
+    return {
+        "status": "ok",
+        "presence": await _presence_payload(room, other),
+        # How far the other party has received / read, for ticks on my messages
+        "receipts": await run_in_session(read_marks, room, other),
+    }
+
+async def _presence_payload(room, participant, status=None, last_seen=None) -> dict:
+    if status is None:
+        status = "online" if await presence.is_online(participant) else "offline"
+        last_seen = None if status == "online" else await presence.last_seen(participant)
+    return {
+        "room": room,
+        "participant": participant,
+        "status": status,
+        "last_seen": last_seen.isoformat() if last_seen else None,
+    }
+
+
+async def _broadcast_presence(participant, status, last_seen):
+    # Called by the presence tracker once per interval with coalesced changes
+    for room in await participant_rooms(participant):
+        await sio.emit("presence", await _presence_payload(room, participant, status, last_seen), room=room)
+
+presence.broadcast = _broadcast_presence
+
+
+async def _emit_typing(room, participant, typing, skip_sid=None):
+    await sio.emit("typing", {"room": room, "participant": participant, "typing": typing}, room=room, skip_sid=skip_sid)
+
+
+async def _typing_timed_out(sid, room):
+    await _emit_typing(room, participant_id(await _principal(sid)), False, skip_sid=sid)
+
+typing_throttle.on_timeout = _typing_timed_out
 
 
 @sio.event
-async def send_message(sid, data):
-    room = data["room"]
+async def typing_start(sid, data=None):
+    """
+    data = {"room": "chat_n7_u1"} - send on keystrokes; the room sees at most one
+    "typing" event per TYPING_THROTTLE_SECONDS, and a stop after TYPING_TIMEOUT_SECONDS idle.
+    """
+    if not isinstance(data, dict):
+        return
+    room = data.get("room")
+    if not _in_chat_room(sid, room):
+        return
+    if typing_throttle.start(sid, room):
+        await _emit_typing(room, participant_id(await _principal(sid)), True, skip_sid=sid)
 
-    print("📩 Message received from client:")
-    print(f"  SID: {sid}")
-    print(f"  ROOM: {room}")
-    print(f"  SENDER: {data.get('sender_id')}")
-    print(f"  TEXT: {data.get('text')}")
+@sio.event
+async def typing_stop(sid, data=None):
+    if not isinstance(data, dict):
+        return
+    room = data.get("room")
+    if _in_chat_room(sid, room) and typing_throttle.stop(sid, room):
+        await _emit_typing(room, participant_id(await _principal(sid)), False, skip_sid=sid)
 
-    # broadcast to everyone in room
-    await sio.emit("receive_message", data, room=room)
+@sio.event
+async def send_message(sid, data=None):
+    """
+    data = {"room": "chat_n7_u1", "text": "Hello", "client_msg_id": "..."}
+    sender_id / receiver_id are taken from the token and the room, not from data.
+    The broadcast carries server-side fields only, plus the optional
+    client_msg_id (a string of at most CLIENT_MSG_ID_MAX_LENGTH characters) so
+    senders can match it to their optimistic copy.
+    """
+    if not isinstance(data, dict):
+        return {"status": "error", "error": "data must be an object"}
+    room = data.get("room")
+    if not _in_chat_room(sid, room):
+        return {"status": "error", "error": "Join the room before sending"}
+    text = data.get("text") or ""
+    if not isinstance(text, str):
+        return {"status": "error", "error": "text must be a string"}
+    # Postgres text columns cannot store NUL
+    text = text.replace("\x00", "")
+    if len(text) > settings.CHAT_MESSAGE_MAX_LENGTH:
+        return {"status": "error", "error": f"text is longer than {settings.CHAT_MESSAGE_MAX_LENGTH} characters"}
+    client_msg_id = data.get("client_msg_id")
+    if client_msg_id is not None and (
+        not isinstance(client_msg_id, str) or len(client_msg_id) > CLIENT_MSG_ID_MAX_LENGTH
+    ):
+        return {"status": "error", "error": f"client_msg_id must be a string of at most {CLIENT_MSG_ID_MAX_LENGTH} characters"}
 
+    sender_id = participant_id(await _principal(sid))
+    nutritionist, client = room_participants(room)
+    # Receivers clear the indicator on receive_message, no stop event needed
+    typing_throttle.stop(sid, room)
 
+    message = {
+        "id": uuid.uuid4(),
+        "room": room,
+        "sender_id": sender_id,
+        "receiver_id": client if sender_id == nutritionist else nutritionist,
+        "text": text,
+        "created_at": datetime.now(timezone.utc),
+    }
+    logger.debug("Message received", extra={"sid": sid, "room": room, "sender": sender_id, "message_id": message["id"], "length": len(message["text"])})
 
-# VERY IMPORTANT NEXT STEPS (Backend-first)
+    # Persisted by the write-behind buffer; the broadcast does not wait for the DB
+    try:
+        chat_buffer.add(message)
+    except ChatBufferFull:
+        return {"status": "error", "error": "Chat is busy, please retry"}
 
-# Now we upgrade this into a real app, not a demo.
+    payload = {
+        "id": str(message["id"]),
+        "room": room,
+        "sender_id": message["sender_id"],
+        "receiver_id": message["receiver_id"],
+        "text": text,
+        "created_at": message["created_at"].isoformat(),
+    }
+    if client_msg_id is not None:
+        payload["client_msg_id"] = client_msg_id
 
-# 🔹 1️⃣ Persist messages (PostgreSQL)
+    # broadcast to everyone in room
+    await sio.emit("receive_message", payload, room=room)
+    return {"status": "ok", "id": payload["id"], "created_at": payload["created_at"]}
 
-# Save every message
 
-# Load chat history when user opens chat
 
-# 🔹 2️⃣ JWT-authenticated sockets
+@sio.event
+async def load_history(sid, data=None):
+    """
+    data = {"room": "chat_n7_u1", "cursor": None, "limit": 50}
+    Ack: {"room", "messages" (newest first), "next_cursor"}
+    """
+    if not isinstance(data, dict):
+        return {"error": "data must be an object"}
+    room = data.get("room")
+    if not room or not isinstance(room, str):
+        return {"error": "room is required"}
+    if not await can_access_room(await _principal(sid), room):
+        return {"error": "Not allowed to read this room"}
+    cursor = data.get("cursor")
+    if cursor is not None and not isinstance(cursor, str):
+        return {"error": "Invalid cursor"}
+    try:
+        limit = max(1, min(int(data.get("limit") or DEFAULT_PAGE_SIZE), MAX_PAGE_SIZE))
+    except (TypeError, ValueError):
+        return {"error": f"limit must be a number up to {MAX_PAGE_SIZE}"}
+    try:
+        return await run_in_session(load_room_history, room, cursor, limit)
+    except ValueError as e:
+        return {"error": str(e)}
 
-# Only logged-in users connect
 
-# Secure room access
+async def _broadcast_receipt(room, participant, marks):
+    # Called by the receipt buffer once per flush with the merged watermarks
+    await sio.emit(
+        "receipt",
+        {
+            "room": room,
+            "participant": participant,
+            "delivered": mark_payload(marks.get("delivered")),
+            "seen": mark_payload(marks.get("seen")),
+        },
+        room=room,
+    )
 
-# 🔹 3️⃣ Online / offline users
+receipt_buffer.broadcast = _broadcast_receipt
 
-# Presence indicator
 
-# Last seen
+async def _receipt_ack(sid, data, kind):
+    if not isinstance(data, dict):
+        return {"error": "data must be an object"}
+    room = data.get("room")
+    if not _in_chat_room(sid, room):
+        return {"error": "Join the room first"}
+    try:
+        message_id = uuid.UUID(str(data["message_id"]))
+        created_at = datetime.fromisoformat(data["created_at"])
+        if created_at.tzinfo is None:
+            raise ValueError
+    except (KeyError, TypeError, ValueError):
+        return {"error": "message_id and created_at (ISO 8601 with offset) are required"}
 
-# 🔹 4️⃣ Typing indicators
-# typing_start
-# typing_stop
+    # A mark can never run ahead of the server clock
+    created_at = min(created_at, datetime.now(timezone.utc))
+    receipt_buffer.ack(room, participant_id(await _principal(sid)), kind, created_at, message_id)
+    return {"status": "ok"}
 
-# 🔹 5️⃣ Read / delivered receipts
-# message_delivered
-# message_seen
+
+@sio.event
+async def message_delivered(sid, data=None):
+    """
+    data = {"room": "chat_n7_u1", "message_id": "...", "created_at": "..."} of the newest
+    message received; everything up to it counts as delivered.
+    """
+    return await _receipt_ack(sid, data, "delivered")
+
+@sio.event
+async def message_seen(sid, data=None):
+    """Same as message_delivered, for the newest message displayed (implies delivered)."""
+    return await _receipt_ack(sid, data, "seen")
+
+@sio.event
+async def unread_counts(sid, data=None):
+    """Ack: {"participant", "rooms": [{"room", "unread"}], "total"}"""
+    participant = participant_id(await _principal(sid))
+    return await run_in_session(load_unread_counts, participant, await participant_rooms(participant))
@@ -1,31 +1,33 @@
 from fastapi import APIRouter, Depends, Query,HTTPException
-from sqlalchemy.orm import Session
-from app.db.database import SessionLocal
+from typing import List
+from sqlalchemy import select, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.database import get_db, run_in_session
+from app.core.coalesce import request_coalescer
+from app.core.security import Principal, require_client
 from app.models.userProfile import UserProfile
 from app.models.user_weight_logs import UserWeightLog
 from dateutil.relativedelta import relativedelta
-from datetime import datetime, timedelta
-from app.schemas.weight_log import WeightUpdateRequest
+from datetime import date, datetime, timedelta
+from app.schemas.weight_log import WeightLogBulkItem, WeightLogBulkResponse, WeightUpdateRequest
+from app.utils.downsample import BUCKETS, downsample_points, pick_bucket, resolve_range
 from decimal import Decimal
+import logging
 
-router = APIRouter(prefix="/weight-log", tags=["Weight Log"])
-
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+logger = logging.getLogger(__name__)
 
+router = APIRouter(prefix="/weight-log", tags=["Weight Log"])
 
 @router.post("/")
-def log_weight(
-    userid: int = Query(..., description="User ID"),
+async def log_weight(
     weight: float = Query(..., description="Weight value"),
     unit: str = Query("kg", description="kg or lbs"),
-    db: Session = Depends(get_db)
+    principal: Principal = Depends(require_client),
+    db: AsyncSession = Depends(get_db)
 ):
-    print(f"Logging weight for user ID: {userid}, weight: {weight}, unit: {unit}")
+    userid = principal.userid
+    logger.debug("Logging weight", extra={"userid": userid, "unit": unit})
 
     entry = UserWeightLog(
         userid=userid,
@@ -33,130 +35,203 @@ def log_weight(
         unit=unit.lower(),
     )
     db.add(entry)
-    db.commit()
-    db.refresh(entry)
+    await db.commit()
+    await db.refresh(entry)
     return {"id": entry.id, "userid": entry.userid, "weight": float(entry.weight), "unit": entry.unit, "entry_date": entry.entry_date}
 
 
 
 
+MAX_BULK_ENTRIES = 500
+
+
+# Bulk import (smart-scale imports, offline-queue flushes); safe to retry
+@router.post("/bulk", response_model=WeightLogBulkResponse)
+async def log_weights_bulk(
+    entries: List[WeightLogBulkItem],
+    principal: Principal = Depends(require_client),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Inserts every entry whose client_id has not been seen for this user, in one
+    INSERT ... ON CONFLICT DO NOTHING. Entries already stored (or repeated within
+    the request) come back as "duplicate" with the id of the original row.
+    """
+    if len(entries) > MAX_BULK_ENTRIES:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BULK_ENTRIES} entries per request")
+
+    userid = principal.userid
+    today = datetime.now().date()
+    rows = {}
+    for entry in entries:
+        rows.setdefault(entry.client_id, {
+            "userid": userid,
+            "weight": entry.weight,
+            "unit": entry.unit,
+            "entry_date": entry.entry_date or today,
+            "client_id": entry.client_id,
+        })
+
+    ids, created = {}, {}
+    if rows:
+        stmt = (
+            insert(UserWeightLog)
+            .values(list(rows.values()))
+            .on_conflict_do_nothing(index_elements=[UserWeightLog.userid, UserWeightLog.client_id])
+            .returning(UserWeightLog.client_id, UserWeightLog.id)
+        )
+        created = dict((await db.execute(stmt)).all())
+
+        # Skipped rows: resolve to the id stored by the earlier upload
+        ids = dict(created)
+        skipped = [client_id for client_id in rows if client_id not in created]
+        if skipped:
+            ids.update((await db.execute(
+                select(UserWeightLog.client_id, UserWeightLog.id).filter(
+                    UserWeightLog.userid == userid,
+                    UserWeightLog.client_id.in_(skipped),
+                )
+            )).all())
+        await db.commit()
+
+    results = []
+    for entry in entries:
+        first_seen = entry.client_id in created
+        results.append({
+            "client_id": entry.client_id,
+            "id": ids[entry.client_id],
+            "status": "created" if first_seen else "duplicate",
+        })
+        created.pop(entry.client_id, None)  # later repeats in the same request are duplicates
+
+    statuses = [r["status"] for r in results]
+    return {
+        "received": len(entries),
+        "created": statuses.count("created"),
+        "duplicates": statuses.count("duplicate"),
+        "results": results,
+    }
+
+
 @router.get("/logs")
-def get_weight_logs(
-    userid: int = Query(...),
+async def get_weight_logs(
     mode: str = Query("daily", enum=["daily", "weekly", "monthly"]),
-    db: Session = Depends(get_db)
+    principal: Principal = Depends(require_client),
 ):
-    if userid is None:
-        raise HTTPException(status_code=400, detail="userid required")
+    # Duplicate in-flight calls (e.g. screen remounts) share one computation
+    userid = principal.userid
+    return await request_coalescer.run(
+        ("weight-logs", userid, mode),
+        lambda: run_in_session(_build_weight_logs, userid, mode),
+    )
 
-    now = datetime.now().date()
 
-    # ---- DAILY MODE ----
+# Per-mode chart buckets. Each yields one row per bucket (i = 0 is the oldest)
+# with the bucket's weight as `value`, NULL where nothing was logged.
+_WEIGHT_BUCKETS_SQL = {
+    # latest entry of each of the last 5 calendar days
+    "daily": """
+        SELECT g.i, CAST(:start AS date) + g.i AS bucket_start,
+               l.weight AS value, l.unit, l.created_at
+        FROM generate_series(0, 4) AS g(i)
+        LEFT JOIN (
+            SELECT DISTINCT ON (entry_date) entry_date, weight, unit, created_at
+            FROM user_weight_log
+            WHERE userid = :userid AND entry_date BETWEEN :start AND :end
+            ORDER BY entry_date, created_at DESC
+        ) l ON l.entry_date = CAST(:start AS date) + g.i
+    """,
+    # average of every entry in 4 consecutive 7-day windows, the last starting today
+    "weekly": """
+        SELECT g.i, CAST(:start AS date) + 7 * g.i AS bucket_start, a.value
+        FROM generate_series(0, 3) AS g(i)
+        LEFT JOIN (
+            SELECT (entry_date - CAST(:start AS date)) / 7 AS i, ROUND(AVG(weight), 2) AS value
+            FROM user_weight_log
+            WHERE userid = :userid AND entry_date BETWEEN :start AND :end
+            GROUP BY 1
+        ) a ON a.i = g.i
+    """,
+    # average of every entry in each of the last 4 calendar months
+    "monthly": """
+        SELECT g.i, CAST(CAST(:start AS date) + make_interval(months => g.i) AS date) AS bucket_start, a.value
+        FROM generate_series(0, 3) AS g(i)
+        LEFT JOIN (
+            SELECT CAST(date_trunc('month', entry_date) AS date) AS month, ROUND(AVG(weight), 2) AS value
+            FROM user_weight_log
+            WHERE userid = :userid AND entry_date BETWEEN :start AND :end
+            GROUP BY 1
+        ) a ON a.month = CAST(CAST(:start AS date) + make_interval(months => g.i) AS date)
+    """,
+}
+
+# Buckets plus everything the chart header needs (min / max, first and last
+# filled bucket for the trend, BMI) in one round trip.
+_WEIGHT_TREND_QUERIES = {
+    mode: text(f"""
+        WITH buckets AS ({buckets_sql})
+        SELECT b.*,
+               MIN(b.value) OVER all_buckets AS min_value,
+               MAX(b.value) OVER all_buckets AS max_value,
+               (array_agg(b.value) FILTER (WHERE b.value IS NOT NULL) OVER all_buckets)[1] AS first_value,
+               (array_agg(b.value) FILTER (WHERE b.value IS NOT NULL) OVER newest_first)[1] AS last_value,
+               (SELECT bmi FROM userprofile WHERE userid = :userid) AS bmi
+        FROM buckets b
+        WINDOW all_buckets AS (ORDER BY b.i ROWS BETWEEN UNBOUNDED PRECEDING AND UNBOUNDED FOLLOWING),
+               newest_first AS (ORDER BY b.i DESC ROWS BETWEEN UNBOUNDED PRECEDING AND UNBOUNDED FOLLOWING)
+        ORDER BY b.i
+    """)
+    for mode, buckets_sql in _WEIGHT_BUCKETS_SQL.items()
+}
+
+
+def _weight_window(mode: str, today: date) -> tuple[date, date]:
+    """First and last entry_date covered by the chart buckets of this mode."""
     if mode == "daily":
-        raw_logs = db.query(UserWeightLog).filter(
-            UserWeightLog.userid == userid,
-            UserWeightLog.entry_date >= now - timedelta(days=5)
-        ).order_by(UserWeightLog.entry_date.desc(), UserWeightLog.created_at.desc()).all()
-
-        # Keep only the most recently updated entry per day
-        latest_per_day = {}
-        for log in raw_logs:
-            if log.entry_date not in latest_per_day:
-                latest_per_day[log.entry_date] = log  # first encounter = latest update of that day
-
-        # Build 5 calendar days response (include missing days)
-        daily_response = []
-        for i in range(4, -1, -1):  # 4 days ago → today = 5 entries total
-            day = now - timedelta(days=i)
-            if day in latest_per_day:
-                log = latest_per_day[day]
-                daily_response.append({
-                    "date": day.isoformat(),
-                    "weight": float(log.weight),
-                    "unit": log.unit,
-                    "created_at": log.created_at.isoformat()
-                })
-            else:
-                daily_response.append({
-                    "date": day.isoformat(),
-                    "weight": None,
-                    "unit": None,
-                    "created_at": None
-                })
-
-        # Extract only filled weights for calculation
-        avg_values = [d["weight"] for d in daily_response if d["weight"] is not None]
-        if not avg_values:
-            return {"userid": userid, "mode": mode, "logs": daily_response}
-
-        values = avg_values
-        logs = daily_response
-
-    # ---- WEEKLY MODE ----
-    elif mode == "weekly":
-        raw_logs = db.query(UserWeightLog).filter(
-            UserWeightLog.userid == userid,
-            UserWeightLog.entry_date >= now - timedelta(days=28)
-        ).all()
+        return today - timedelta(days=4), today
+    if mode == "weekly":
+        start = today - timedelta(days=21)
+        return start, start + timedelta(days=27)
+    start = (today - relativedelta(months=3)).replace(day=1)
+    return start, start + relativedelta(months=4) - timedelta(days=1)
 
-        weekly_response = []
-        for i in range(4):
-            w_start = now - timedelta(days=7 * (3-i))
-            w_end = w_start + timedelta(days=6)
 
-            week_values = [
-                float(l.weight) for l in raw_logs
-                if w_start <= l.entry_date <= w_end
-            ]
+def _float_or_none(value):
+    return float(value) if value is not None else None
 
-            avg_w = round(sum(week_values)/len(week_values), 2) if week_values else None
-            print(f"Week {w_start} to {w_end}: values={week_values} avg={avg_w}")
 
-            weekly_response.append({
-                "week_start": w_start.isoformat(),
-                "avg_weight": avg_w
-            })
+async def _build_weight_logs(db: AsyncSession, userid: int, mode: str):
+    start, end = _weight_window(mode, datetime.now().date())
+    rows = (
+        await db.execute(_WEIGHT_TREND_QUERIES[mode], {"userid": userid, "start": start, "end": end})
+    ).mappings().all()
 
-        calc_weeks = [w["avg_weight"] for w in weekly_response if w["avg_weight"] is not None]
-        if not calc_weeks:
-            return {"userid": userid, "mode": mode, "logs": weekly_response}
-
-        values = calc_weeks
-        logs = weekly_response
-
-    # ---- MONTHLY MODE ----
+    if mode == "daily":
+        logs = [
+            {
+                "date": row["bucket_start"].isoformat(),
+                "weight": _float_or_none(row["value"]),
+                "unit": row["unit"],
+                "created_at": row["created_at"].isoformat() if row["created_at"] else None,
+            }
+            for row in rows
+        ]
+    elif mode == "weekly":
+        logs = [
+            {"week_start": row["bucket_start"].isoformat(), "avg_weight": _float_or_none(row["value"])}
+            for row in rows
+        ]
     else:  # monthly
-        raw_logs = db.query(UserWeightLog).filter(
-            UserWeightLog.userid == userid,
-            UserWeightLog.entry_date >= now - relativedelta(months=4)
-        ).all()
+        logs = [
+            {"month": row["bucket_start"].strftime("%Y-%m"), "avg_weight": _float_or_none(row["value"])}
+            for row in rows
+        ]
 
-        monthly_response = []
-        for i in range(4):
-            m_start = now - relativedelta(months=3-i)
-            m_key = m_start.strftime("%Y-%m")
+    summary = rows[0]
+    if summary["first_value"] is None:
+        return {"userid": userid, "mode": mode, "logs": logs}
 
-            month_values = [
-                float(l.weight) for l in raw_logs
-                if m_key == l.entry_date.strftime("%Y-%m")
-            ]
-
-            avg_m = round(sum(month_values)/len(month_values), 2) if month_values else None
-
-            monthly_response.append({
-                "month": m_key,
-                "avg_weight": avg_m
-            })
-
-        calc_months = [m["avg_weight"] for m in monthly_response if m["avg_weight"] is not None]
-        if not calc_months:
-            return {"userid": userid, "mode": mode, "logs": monthly_response}
-
-        values = calc_months
-        logs = monthly_response
-
-    # ---- COMMON CALCULATIONS BASED ON AVERAGES ----
-    first_w, latest_w = values[0], values[-1]
+    first_w, latest_w = float(summary["first_value"]), float(summary["last_value"])
     diff = latest_w - first_w
 
     trend = "stable"
@@ -165,35 +240,95 @@ def get_weight_logs(
     elif diff < 0:
         trend = "down"
 
-    min_w, max_w = min(values), max(values)
-
-    # ---- Optional BMI ----
-    user = db.query(UserProfile).filter(UserProfile.userid == userid).first()
-    bmi = float(user.bmi) if user and user.bmi is not None else None
-
-    # ---- Final Response ----
     return {
         "userid": userid,
         "mode": mode,
-        "bmi": bmi,
-        "min_weight": min_w,
-        "max_weight": max_w,
+        "bmi": _float_or_none(summary["bmi"]),
+        "min_weight": float(summary["min_value"]),
+        "max_weight": float(summary["max_value"]),
         "weight_diff": diff,
         "trend": trend,
         "logs": logs
     }
 
 
+# Arbitrary-range chart: one row per non-empty bucket with an avg / min / max envelope
+_WEIGHT_RANGE_QUERY = text("""
+    SELECT CAST(date_trunc(:bucket, entry_date) AS date) AS start,
+           ROUND(AVG(weight), 2) AS avg,
+           MIN(weight) AS min,
+           MAX(weight) AS max,
+           COUNT(*) AS count
+    FROM user_weight_log
+    WHERE userid = :userid AND entry_date BETWEEN :start AND :end
+    GROUP BY 1
+    ORDER BY 1
+""")
+
+
+@router.get("/range")
+async def get_weight_range(
+    from_date: date | None = Query(None, alias="from", description="First day (default: 90 days before 'to')"),
+    to_date: date | None = Query(None, alias="to", description="Last day (default: today)"),
+    bucket: str = Query("auto", enum=["auto", *BUCKETS]),
+    max_points: int = Query(200, ge=10, le=1000, description="Upper bound on returned points"),
+    principal: Principal = Depends(require_client),
+):
+    try:
+        start, end = resolve_range(from_date, to_date)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if bucket == "auto":
+        bucket = pick_bucket(start, end, max_points)
+
+    userid = principal.userid
+    return await request_coalescer.run(
+        ("weight-range", userid, start, end, bucket, max_points),
+        lambda: run_in_session(_build_weight_range, userid, start, end, bucket, max_points),
+    )
+
+
+async def _build_weight_range(db: AsyncSession, userid: int, start: date, end: date, bucket: str, max_points: int):
+    rows = (
+        await db.execute(
+            _WEIGHT_RANGE_QUERY,
+            {"userid": userid, "start": start, "end": end, "bucket": bucket},
+        )
+    ).mappings().all()
+
+    # An explicit fine bucket over a long range is reduced by LTTB on the averages
+    points = downsample_points([dict(row) for row in rows], max_points)
 
+    return {
+        "userid": userid,
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        "bucket": bucket,
+        "downsampled": len(points) < len(rows),
+        "points": [
+            {
+                "start": p["start"].isoformat(),
+                "avg": float(p["avg"]),
+                "min": float(p["min"]),
+                "max": float(p["max"]),
+                "count": p["count"],
+            }
+            for p in points
+        ],
+    }
 
 
 @router.put("/user/{userid}/weight-target")
-def update_start_and_target_weight(
+async def update_start_and_target_weight(
     userid: int,
     data: WeightUpdateRequest,
-    db: Session = Depends(get_db)
+    principal: Principal = Depends(require_client),
+    db: AsyncSession = Depends(get_db)
 ):
-    user = db.query(UserProfile).filter(UserProfile.userid == userid).first()
+    if userid != principal.userid:
+        raise HTTPException(status_code=403, detail="Cannot update another user's targets")
+
+    user = await db.scalar(select(UserProfile).filter(UserProfile.userid == userid))
 
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
@@ -217,8 +352,8 @@ def update_start_and_target_weight(
         user.weight_unit = u  # save normalized unit if you store it in profile
 
     # ✅ Commit changes
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
 
     return {
         "message": "Starting Weight and Target Weight updated successfully ✅",
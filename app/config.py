@@ -10,6 +10,68 @@ class Settings(BaseSettings):
     MAIL_PORT: Optional[int] = None
     MAIL_USE_TLS: Optional[bool] = None
 
+    # OTP delivery queue
+    MAIL_QUEUE_WORKERS: int = 2
+    MAIL_QUEUE_MAXSIZE: int = 10000
+    MAIL_BATCH_SIZE: int = 20
+    MAIL_MAX_RETRIES: int = 3
+    MAIL_RETRY_BACKOFF: float = 1.0
+    MAIL_SMTP_TIMEOUT: float = 10.0
+    MAIL_SMTP_IDLE_TIMEOUT: float = 60.0
+
+    # Database connection pool
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: float = 30
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+
+    # Nutritionist dashboard cache: "memory" (per process) or "redis"
+    CACHE_BACKEND: str = "memory"
+    CACHE_TTL_SECONDS: int = 60
+    CACHE_MAXSIZE: int = 4096
+    REDIS_URL: Optional[str] = None
+
+    # Socket.IO fan-out across workers: Redis pub/sub when set, else in-process only
+    SOCKETIO_REDIS_URL: Optional[str] = None
+    SOCKETIO_CHANNEL: str = "wellthier-socketio"
+
+    # Chat rooms each user may join, cached per user
+    CHAT_ROOM_CACHE_TTL_SECONDS: int = 300
+    CHAT_ROOM_CACHE_MAXSIZE: int = 10000
+
+    # Chat write-behind buffer: flushed every interval or once the batch size is reached
+    CHAT_FLUSH_INTERVAL_MS: int = 200
+    CHAT_FLUSH_BATCH_SIZE: int = 500
+    CHAT_BUFFER_MAXSIZE: int = 50000
+    CHAT_MESSAGE_MAX_LENGTH: int = 4000
+
+    # Chat presence: offline only after a grace period, changes broadcast in batches,
+    # last-seen times written in batches; typing indicators throttled per sender
+    PRESENCE_GRACE_SECONDS: float = 5.0
+    PRESENCE_BROADCAST_INTERVAL_MS: int = 1000
+    LAST_SEEN_FLUSH_SECONDS: float = 10.0
+    TYPING_THROTTLE_SECONDS: float = 2.0
+    TYPING_TIMEOUT_SECONDS: float = 6.0
+
+    # Delivered / seen acks are merged per room and participant, written every interval
+    RECEIPT_FLUSH_INTERVAL_MS: int = 500
+
+    # Logging: root level, per-logger overrides ("app.api.socket=DEBUG,sqlalchemy.engine=WARNING"),
+    # and "json" (one object per line) or "text" output
+    LOG_LEVEL: str = "INFO"
+    LOG_LEVELS: str = ""
+    LOG_FORMAT: str = "json"
+
+    # Requests running more SQL statements than this are logged as likely N+1s
+    METRICS_QUERY_WARN_THRESHOLD: int = 20
+
+    # Verified JWTs kept in memory until they expire
+    JWT_CACHE_MAXSIZE: int = 10000
+
+    # Shared secret for /api/admin and /metrics (X-Admin-Token header); unset disables them
+    ADMIN_TOKEN: Optional[str] = None
+
     GOOGLE_REDIRECT_URI: Optional[str] = None
     GOOGLE_CLIENT_SECRET: Optional[str] = None
     GOOGLE_CLIENT_ID: Optional[str] = None
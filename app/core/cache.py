@@ -0,0 +1,140 @@
+import json
+import logging
+
+from cachetools import TTLCache
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def nutritionist_owner(nutritionist_id: int) -> str:
+    return f"nutritionist:{nutritionist_id}"
+
+
+class MemoryCacheBackend:
+    """Process-local LRU cache with a per-entry TTL."""
+
+    def __init__(self, maxsize: int, ttl: int):
+        self._entries = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    async def get(self, owner: str, name: str):
+        return self._entries.get((owner, name))
+
+    async def set(self, owner: str, name: str, value):
+        self._entries[(owner, name)] = value
+
+    async def invalidate(self, owner: str):
+        for key in [k for k in list(self._entries.keys()) if k[0] == owner]:
+            self._entries.pop(key, None)
+
+
+class RedisCacheBackend:
+    """Redis-backed cache shared by every worker.
+
+    Entries live at `<prefix>:<owner>:<name>`; `<prefix>:<owner>:keys` indexes
+    them so an owner can be invalidated without scanning the keyspace.
+    """
+
+    def __init__(self, url: str, ttl: int, prefix: str = "wellthier:cache"):
+        import redis.asyncio as redis
+
+        self._redis = redis.from_url(url)
+        self._ttl = ttl
+        self._prefix = prefix
+
+    def _key(self, owner: str, name: str) -> str:
+        return f"{self._prefix}:{owner}:{name}"
+
+    def _index(self, owner: str) -> str:
+        return f"{self._prefix}:{owner}:keys"
+
+    async def get(self, owner: str, name: str):
+        raw = await self._redis.get(self._key(owner, name))
+        return json.loads(raw) if raw is not None else None
+
+    async def set(self, owner: str, name: str, value):
+        key = self._key(owner, name)
+        async with self._redis.pipeline(transaction=False) as pipe:
+            pipe.set(key, json.dumps(value), ex=self._ttl)
+            pipe.sadd(self._index(owner), key)
+            pipe.expire(self._index(owner), self._ttl)
+            await pipe.execute()
+
+    async def invalidate(self, owner: str):
+        index = self._index(owner)
+        keys = await self._redis.smembers(index)
+        await self._redis.delete(index, *keys)
+
+
+class ResponseCache:
+    """Caches computed endpoint payloads per owner and counts hits and misses.
+
+    Backend errors are logged and treated as misses so a cache outage
+    never fails the request.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.errors = 0
+
+    async def get_or_compute(self, owner: str, name: str, compute):
+        try:
+            cached = await self.backend.get(owner, name)
+        except Exception:
+            self.errors += 1
+            logger.exception("Cache read failed for %s/%s", owner, name)
+            cached = None
+
+        if cached is not None:
+            self.hits += 1
+            return cached
+
+        self.misses += 1
+        value = await compute()
+        try:
+            await self.backend.set(owner, name, value)
+        except Exception:
+            self.errors += 1
+            logger.exception("Cache write failed for %s/%s", owner, name)
+        return value
+
+    async def invalidate(self, owner: str):
+        self.invalidations += 1
+        try:
+            await self.backend.invalidate(owner)
+        except Exception:
+            self.errors += 1
+            logger.exception("Cache invalidation failed for %s", owner)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "errors": self.errors,
+        }
+
+
+def _build_backend():
+    if settings.CACHE_BACKEND == "redis":
+        if not settings.REDIS_URL:
+            raise RuntimeError("CACHE_BACKEND=redis requires REDIS_URL")
+        return RedisCacheBackend(settings.REDIS_URL, ttl=settings.CACHE_TTL_SECONDS)
+    return MemoryCacheBackend(maxsize=settings.CACHE_MAXSIZE, ttl=settings.CACHE_TTL_SECONDS)
+
+
+# Nutritionist dashboard payloads (last-login analytics, upcoming birthdays)
+analytics_cache = ResponseCache(_build_backend())
+
+
+async def invalidate_nutritionists(nutritionist_ids):
+    """Invalidation hook: call when a login is recorded for, or a referral is
+    added/removed between, a client and these nutritionists."""
+    for nutritionist_id in set(nutritionist_ids):
+        await analytics_cache.invalidate(nutritionist_owner(nutritionist_id))
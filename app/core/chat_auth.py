@@ -0,0 +1,85 @@
+import re
+
+from cachetools import TTLCache
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.core.coalesce import request_coalescer
+from app.core.security import Principal
+from app.db.database import run_in_session
+from app.models.referral import ClientNutritionistReferral
+
+# One chat room per client-nutritionist link
+_ROOM_RE = re.compile(r"^chat_n(\d+)_u(\d+)$")
+
+
+def chat_room(nutritionist_id: int, userid: int) -> str:
+    return f"chat_n{nutritionist_id}_u{userid}"
+
+
+def room_participants(room: str) -> tuple[str, str] | None:
+    """("n<nutritionist_id>", "u<userid>") for a chat room name, None if it is not one."""
+    match = _ROOM_RE.match(room or "")
+    if not match:
+        return None
+    return f"n{match.group(1)}", f"u{match.group(2)}"
+
+
+def participant_id(principal: Principal) -> str | None:
+    """Chat identity of a token: "n<nutritionist_id>" or "u<userid>"."""
+    if principal.nutritionist_id:
+        return f"n{principal.nutritionist_id}"
+    if principal.userid:
+        return f"u{principal.userid}"
+    return None
+
+
+# participant_id -> frozenset of rooms it may join
+_room_cache = TTLCache(maxsize=settings.CHAT_ROOM_CACHE_MAXSIZE, ttl=settings.CHAT_ROOM_CACHE_TTL_SECONDS)
+
+
+async def _load_rooms(db: AsyncSession, participant: str) -> frozenset:
+    kind, ident = participant[0], int(participant[1:])
+    if kind == "n":
+        userids = await db.scalars(
+            select(ClientNutritionistReferral.userid).filter_by(nutritionist_id=ident)
+        )
+        return frozenset(chat_room(ident, userid) for userid in userids)
+    nutritionist_ids = await db.scalars(
+        select(ClientNutritionistReferral.nutritionist_id).filter_by(userid=ident)
+    )
+    return frozenset(chat_room(nutritionist_id, ident) for nutritionist_id in nutritionist_ids)
+
+
+async def participant_rooms(participant: str) -> frozenset:
+    """Rooms a participant ("n<id>" / "u<id>") may join."""
+    rooms = _room_cache.get(participant)
+    if rooms is None:
+        # Reconnect storms for one user share a single lookup
+        rooms = await request_coalescer.run(("chat-rooms", participant), lambda: run_in_session(_load_rooms, participant))
+        _room_cache[participant] = rooms
+    return rooms
+
+
+async def allowed_rooms(principal: Principal) -> frozenset:
+    key = participant_id(principal)
+    if key is None:
+        return frozenset()
+    return await participant_rooms(key)
+
+
+async def can_access_room(principal: Principal, room: str) -> bool:
+    if room_participants(room) is None:
+        return False
+    return room in await allowed_rooms(principal)
+
+
+def invalidate_chat_rooms(nutritionist_ids=(), userids=()):
+    """Invalidation hook: call when a referral is added/removed between these
+    nutritionists and clients (entries otherwise expire after the cache TTL)."""
+    for nutritionist_id in nutritionist_ids:
+        _room_cache.pop(f"n{nutritionist_id}", None)
+    for userid in userids:
+        _room_cache.pop(f"u{userid}", None)
+
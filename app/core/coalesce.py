@@ -0,0 +1,44 @@
+import asyncio
+
+
+class RequestCoalescer:
+    """Share one in-flight computation between identical concurrent requests.
+
+    The first caller for a key starts the work as a task; callers arriving
+    before it finishes await the same task and receive the same result (or
+    exception). Nothing is cached once the task completes.
+    """
+
+    def __init__(self):
+        self._inflight = {}
+        self.executed = 0
+        self.coalesced = 0
+
+    async def run(self, key, compute):
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(compute())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._finished(key, t))
+            self.executed += 1
+        else:
+            self.coalesced += 1
+        # A disconnecting caller must not cancel work other callers wait on
+        return await asyncio.shield(task)
+
+    def _finished(self, key, task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # mark retrieved even if every waiter went away
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._inflight),
+            "executed": self.executed,
+            "coalesced": self.coalesced,
+        }
+
+
+# Read endpoints keyed by (route, user, parameters)
+request_coalescer = RequestCoalescer()
@@ -1,14 +1,233 @@
+import asyncio
+import logging
 import smtplib
 from email.mime.text import MIMEText
 from app.config import settings
 
-def send_otp_email(to_email: str, otp_code: str, subject: str = "Your OTP"):
+logger = logging.getLogger(__name__)
+
+
+class MailQueueFull(Exception):
+    """Raised when the OTP delivery queue cannot accept more messages."""
+
+
+def build_otp_message(to_email: str, otp_code: str, subject: str = "Your OTP") -> MIMEText:
     msg = MIMEText(f"Your OTP is: {otp_code}")
     msg["Subject"] = subject
     msg["From"] = settings.MAIL_USERNAME
     msg["To"] = to_email
+    return msg
+
+
+class SMTPSession:
+    """One persistent, authenticated SMTP connection reused across sends.
+
+    All methods block and are meant to be called from a worker thread.
+    """
+
+    def __init__(self):
+        self._server = None
+
+    def _connect(self):
+        server = smtplib.SMTP(settings.MAIL_SERVER, settings.MAIL_PORT, timeout=settings.MAIL_SMTP_TIMEOUT)
+        # STARTTLS unless explicitly disabled (e.g. a local test sink)
+        if settings.MAIL_USE_TLS is not False:
+            server.starttls()
+        if settings.MAIL_PASSWORD:
+            server.login(settings.MAIL_USERNAME, settings.MAIL_PASSWORD)
+        self._server = server
+
+    def close(self):
+        if self._server is None:
+            return
+        try:
+            self._server.quit()
+        except (smtplib.SMTPException, OSError):
+            pass
+        self._server = None
+
+    def _send(self, msg: MIMEText):
+        if self._server is None:
+            self._connect()
+        self._server.sendmail(settings.MAIL_USERNAME, [msg["To"]], msg.as_string())
+
+    def send_batch(self, messages: list) -> list:
+        """Send every message over the same connection; returns one error (or None) per message."""
+        errors = []
+        for msg in messages:
+            try:
+                try:
+                    self._send(msg)
+                except smtplib.SMTPServerDisconnected:
+                    # Server dropped an idle connection - reconnect once and resend
+                    self._server = None
+                    self._send(msg)
+                errors.append(None)
+            except (smtplib.SMTPException, OSError) as e:
+                if not isinstance(e, smtplib.SMTPRecipientsRefused):
+                    self.close()
+                errors.append(e)
+        return errors
+
+
+def is_permanent(error: Exception) -> bool:
+    """5xx replies, including recipients refused with 5xx, fail the same way on every retry."""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(500 <= code < 600 for code, _ in error.recipients.values())
+    return isinstance(error, smtplib.SMTPResponseException) and 500 <= error.smtp_code < 600
+
+
+class _MailJob:
+    __slots__ = ("message", "attempts")
+
+    def __init__(self, message: MIMEText):
+        self.message = message
+        self.attempts = 0
 
-    with smtplib.SMTP(settings.MAIL_SERVER, settings.MAIL_PORT) as server:
-        server.starttls()
-        server.login(settings.MAIL_USERNAME, settings.MAIL_PASSWORD)
-        server.sendmail(settings.MAIL_USERNAME, [to_email], msg.as_string())
\ No newline at end of file
+
+class OTPMailQueue:
+    """In-process OTP delivery queue.
+
+    Handlers enqueue and return immediately; worker tasks each own a persistent
+    SMTP session, drain the queue in batches and retry transient failures
+    (connection errors, 4xx replies) with exponential backoff.
+    """
+
+    def __init__(self, workers: int, batch_size: int, max_retries: int, retry_backoff: float, maxsize: int):
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.maxsize = maxsize
+        self._queue = None
+        self._tasks = []
+        self._retry_tasks = set()
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.rejected = 0
+        self.in_flight = 0
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    def _ensure_workers(self):
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.maxsize)
+        if not self.running:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def start(self):
+        self._ensure_workers()
+
+    async def stop(self, timeout: float = 10.0):
+        """Flush what is queued (bounded by timeout), then stop the workers."""
+        if not self.running:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        undelivered = self._queue.qsize() + len(self._retry_tasks)
+        if undelivered:
+            logger.warning("OTP mail queue stopped with %d messages undelivered", undelivered)
+        for task in [*self._tasks, *self._retry_tasks]:
+            task.cancel()
+        await asyncio.gather(*self._tasks, *self._retry_tasks, return_exceptions=True)
+        self._tasks = []
+        self._retry_tasks.clear()
+
+    def enqueue(self, message: MIMEText):
+        # Workers start lazily so enqueueing works even without the app lifespan
+        self._ensure_workers()
+        try:
+            self._queue.put_nowait(_MailJob(message))
+        except asyncio.QueueFull:
+            raise MailQueueFull("OTP mail queue is full")
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "in_flight": self.in_flight,
+            "pending_retries": len(self._retry_tasks),
+            "workers": len(self._tasks),
+            "sent": self.sent,
+            "failed": self.failed,
+            "retried": self.retried,
+            "rejected": self.rejected,
+        }
+
+    async def _next_batch(self) -> list:
+        jobs = []
+        try:
+            jobs.append(await asyncio.wait_for(self._queue.get(), settings.MAIL_SMTP_IDLE_TIMEOUT))
+        except asyncio.TimeoutError:
+            return jobs
+        while len(jobs) < self.batch_size and not self._queue.empty():
+            jobs.append(self._queue.get_nowait())
+        return jobs
+
+    async def _worker(self):
+        session = SMTPSession()
+        try:
+            while True:
+                jobs = await self._next_batch()
+                if not jobs:
+                    # Idle for a while - give the connection back to the server
+                    await asyncio.to_thread(session.close)
+                    continue
+                self.in_flight += len(jobs)
+                try:
+                    errors = await asyncio.to_thread(session.send_batch, [j.message for j in jobs])
+                except Exception as e:
+                    errors = [e] * len(jobs)
+                finally:
+                    self.in_flight -= len(jobs)
+                for job, error in zip(jobs, errors):
+                    if error is None:
+                        self.sent += 1
+                    else:
+                        self._retry_or_drop(job, error)
+                    self._queue.task_done()
+        finally:
+            await asyncio.to_thread(session.close)
+
+    def _retry_or_drop(self, job: _MailJob, error: Exception):
+        job.attempts += 1
+        if is_permanent(error):
+            self.failed += 1
+            self.rejected += 1
+            logger.error("OTP email to %s rejected by the mail server: %s", job.message["To"], error)
+            return
+        if job.attempts > self.max_retries:
+            self.failed += 1
+            logger.error("Giving up on OTP email to %s after %d attempts: %s", job.message["To"], job.attempts, error)
+            return
+        self.retried += 1
+        delay = self.retry_backoff * 2 ** (job.attempts - 1)
+        task = asyncio.create_task(self._requeue_later(job, delay))
+        self._retry_tasks.add(task)
+        task.add_done_callback(self._retry_tasks.discard)
+
+    async def _requeue_later(self, job: _MailJob, delay: float):
+        await asyncio.sleep(delay)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            self.failed += 1
+            logger.error("Dropping OTP email to %s: queue full on retry", job.message["To"])
+
+
+otp_mailer = OTPMailQueue(
+    workers=settings.MAIL_QUEUE_WORKERS,
+    batch_size=settings.MAIL_BATCH_SIZE,
+    max_retries=settings.MAIL_MAX_RETRIES,
+    retry_backoff=settings.MAIL_RETRY_BACKOFF,
+    maxsize=settings.MAIL_QUEUE_MAXSIZE,
+)
+
+
+def send_otp_email(to_email: str, otp_code: str, subject: str = "Your OTP"):
+    """Queue an OTP email for background delivery; returns without touching SMTP."""
+    otp_mailer.enqueue(build_otp_message(to_email, otp_code, subject))
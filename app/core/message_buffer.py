@@ -0,0 +1,175 @@
+import asyncio
+import logging
+import time
+from collections import deque
+
+from sqlalchemy import exc
+from sqlalchemy.dialects.postgresql import insert
+
+from app.config import settings
+from app.db.database import AsyncSessionLocal
+from app.models.chat_message import ChatMessage
+
+logger = logging.getLogger(__name__)
+
+# SQLSTATE classes that no retry can fix: 22 data exception (e.g. NUL in text),
+# 23 integrity constraint violation
+_PERMANENT_SQLSTATE_CLASSES = ("22", "23")
+
+
+def _is_permanent(error: exc.DBAPIError) -> bool:
+    if isinstance(error, (exc.DataError, exc.IntegrityError)):
+        return True
+    sqlstate = getattr(error.orig, "sqlstate", None) or getattr(error.orig, "pgcode", None)
+    return bool(sqlstate) and sqlstate[:2] in _PERMANENT_SQLSTATE_CLASSES
+
+
+class ChatBufferFull(Exception):
+    """Raised when unflushed chat messages have reached CHAT_BUFFER_MAXSIZE."""
+
+
+class ChatMessageBuffer:
+    """Write-behind buffer for chat messages.
+
+    `add` only appends to memory, so the Socket.IO broadcast never waits on
+    Postgres. A background task writes the backlog in multi-row inserts every
+    flush interval, or as soon as a full batch is waiting. A failed flush keeps
+    the messages for the next attempt; inserts ignore ids already stored, so a
+    retry after an ambiguous commit cannot duplicate rows. A batch rejected by
+    the database itself (bad data, constraint) is split until the offending
+    rows are found; those are logged and dropped so they cannot block the queue.
+    """
+
+    def __init__(self, flush_interval: float, batch_size: int, maxsize: int):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.maxsize = maxsize
+        self._pending = deque()
+        self._batch_ready = None
+        self._flush_lock = None
+        self._task = None
+        self._flushing = []
+        self.flushed = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.dropped = 0
+        self.last_flush_ms = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def _ensure_flusher(self):
+        if self._batch_ready is None:
+            self._batch_ready = asyncio.Event()
+            self._flush_lock = asyncio.Lock()
+        if not self.running:
+            self._task = asyncio.create_task(self._run())
+
+    async def start(self):
+        self._ensure_flusher()
+
+    async def stop(self):
+        """Stop the flusher and write everything still buffered."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._pending:
+            await self.flush()
+        if self._pending:
+            logger.error("Chat buffer stopped with %d messages unsaved", len(self._pending))
+
+    def add(self, message: dict):
+        """Queue a ChatMessage row (id, room, sender_id, receiver_id, text, created_at)."""
+        # The flusher starts lazily so sends work even without the app lifespan
+        self._ensure_flusher()
+        if len(self._pending) >= self.maxsize:
+            raise ChatBufferFull("Chat message buffer is full")
+        self._pending.append(message)
+        if len(self._pending) >= self.batch_size:
+            self._batch_ready.set()
+
+    def pending(self, room: str) -> list:
+        """Messages of a room not yet committed (including a batch being written), oldest first."""
+        return [m for m in (*self._flushing, *self._pending) if m["room"] == room]
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._batch_ready.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._batch_ready.clear()
+            await self.flush()
+
+    async def flush(self):
+        async with self._flush_lock:
+            # Only what is buffered now; later arrivals wait for the next tick
+            # instead of being trickled out one insert at a time
+            remaining = len(self._pending)
+            while remaining > 0 and self._pending:
+                batch = [self._pending.popleft() for _ in range(min(self.batch_size, remaining, len(self._pending)))]
+                remaining -= len(batch)
+                self._flushing = batch
+                started = time.perf_counter()
+                dropped_before = self.dropped
+                try:
+                    await self._insert_isolating(batch)
+                except BaseException as e:
+                    # Put the batch back in order; retried on the next tick (or by stop() if cancelled)
+                    self._pending.extendleft(reversed(batch))
+                    if not isinstance(e, Exception):
+                        raise
+                    self.failed_flushes += 1
+                    logger.exception("Chat buffer flush of %d messages failed", len(batch))
+                    return
+                finally:
+                    self._flushing = []
+                self.flushes += 1
+                self.flushed += len(batch) - (self.dropped - dropped_before)
+                self.last_flush_ms = round((time.perf_counter() - started) * 1000, 2)
+
+    async def _insert(self, batch: list):
+        async with AsyncSessionLocal() as db:
+            await db.execute(insert(ChatMessage).on_conflict_do_nothing(index_elements=[ChatMessage.id]), batch)
+            await db.commit()
+
+    async def _insert_isolating(self, batch: list):
+        """Insert `batch`; on a permanent error bisect it and drop the rows that fail alone.
+        Transient errors (connection, timeout) propagate so the batch is retried."""
+        try:
+            await self._insert(batch)
+        except exc.DBAPIError as e:
+            if not _is_permanent(e):
+                raise
+            if len(batch) == 1:
+                self.dropped += 1
+                message = batch[0]
+                logger.error(
+                    "Dropped chat message rejected by the database",
+                    extra={"message_id": message.get("id"), "room": message.get("room"), "error": str(e.orig)},
+                )
+                return
+            middle = len(batch) // 2
+            await self._insert_isolating(batch[:middle])
+            await self._insert_isolating(batch[middle:])
+
+    def stats(self) -> dict:
+        return {
+            "depth": len(self._pending),
+            "in_flight": len(self._flushing),
+            "flushed": self.flushed,
+            "flushes": self.flushes,
+            "failed_flushes": self.failed_flushes,
+            "dropped": self.dropped,
+            "last_flush_ms": self.last_flush_ms,
+            "running": self.running,
+        }
+
+
+chat_buffer = ChatMessageBuffer(
+    flush_interval=settings.CHAT_FLUSH_INTERVAL_MS / 1000,
+    batch_size=settings.CHAT_FLUSH_BATCH_SIZE,
+    maxsize=settings.CHAT_BUFFER_MAXSIZE,
+)
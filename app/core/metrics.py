@@ -0,0 +1,190 @@
+import logging
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from sqlalchemy import event
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class Histogram:
+    """Fixed-bucket histogram with Prometheus (cumulative, `le`) semantics."""
+
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total = 0
+        for bound, n in zip((*self.buckets, "+Inf"), self.counts):
+            total += n
+            yield bound, total
+
+
+class RequestStats:
+    """SQL statements run and time spent in the database while handling one request."""
+
+    __slots__ = ("queries", "db_time")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+
+
+# Stats of the request being handled; SQLAlchemy runs the async driver in a
+# greenlet that inherits this context, so engine events can reach it
+_current: ContextVar[RequestStats | None] = ContextVar("request_stats", default=None)
+
+
+class RequestMetrics:
+    """Per-route latency, SQL statement count and DB time histograms, plus totals
+    for statements run outside any request (background flushers)."""
+
+    def __init__(self, query_warn_threshold: int):
+        self.query_warn_threshold = query_warn_threshold
+        self.latency = {}     # (method, route, status) -> Histogram (seconds)
+        self.queries = {}     # (method, route) -> Histogram (statements per request)
+        self.db_time = {}     # (method, route) -> Histogram (seconds per request)
+        self.background_queries = 0
+        self.background_db_time = 0.0
+
+    def observe(self, method: str, route: str, status: int, elapsed: float, stats: RequestStats):
+        key = (method, route)
+        self.latency.setdefault((method, route, status), Histogram(LATENCY_BUCKETS)).observe(elapsed)
+        self.queries.setdefault(key, Histogram(QUERY_BUCKETS)).observe(stats.queries)
+        self.db_time.setdefault(key, Histogram(LATENCY_BUCKETS)).observe(stats.db_time)
+        if stats.queries > self.query_warn_threshold:
+            # Usually an N+1: one statement per row instead of one per request
+            logger.warning(
+                "Request ran many SQL statements",
+                extra={"method": method, "route": route, "queries": stats.queries, "db_ms": round(stats.db_time * 1000, 2)},
+            )
+
+    def record_query(self, elapsed: float):
+        stats = _current.get()
+        if stats is None:
+            self.background_queries += 1
+            self.background_db_time += elapsed
+        else:
+            stats.queries += 1
+            stats.db_time += elapsed
+
+
+request_metrics = RequestMetrics(query_warn_threshold=settings.METRICS_QUERY_WARN_THRESHOLD)
+
+
+def instrument_engine(engine):
+    """Time every statement run on `engine` (an AsyncEngine or Engine)."""
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        request_metrics.record_query(time.perf_counter() - conn.info["query_started"].pop())
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _error(context):
+        started = context.connection.info.get("query_started") if context.connection is not None else None
+        if started:
+            request_metrics.record_query(time.perf_counter() - started.pop())
+
+
+class MetricsMiddleware:
+    """ASGI middleware: times each HTTP request and attributes its SQL statements
+    to the matched route template (unmatched paths share one label)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        status = 500
+        started = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            _current.reset(token)
+            route = scope.get("route")
+            request_metrics.observe(
+                scope["method"],
+                getattr(route, "path", "<unmatched>"),
+                status,
+                time.perf_counter() - started,
+                stats,
+            )
+
+
+def _labels(**labels) -> str:
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels.items()) + "}"
+
+
+def _histogram_lines(name: str, help_text: str, series: dict, label_names: tuple) -> list:
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+    for key, hist in sorted(series.items(), key=lambda item: tuple(map(str, item[0]))):
+        labels = dict(zip(label_names, key))
+        for bound, total in hist.cumulative():
+            lines.append(f"{name}_bucket{_labels(**labels, le=bound)} {total}")
+        lines.append(f"{name}_sum{_labels(**labels)} {hist.sum}")
+        lines.append(f"{name}_count{_labels(**labels)} {hist.count}")
+    return lines
+
+
+def render_prometheus(gauges: dict) -> str:
+    """
+    Prometheus text exposition of the request histograms plus `gauges`:
+    {component: stats dict}; numeric values become `wellthier_<component>_<key>`.
+    """
+    m = request_metrics
+    lines = []
+    lines += _histogram_lines(
+        "wellthier_http_request_duration_seconds", "HTTP request latency by route",
+        m.latency, ("method", "route", "status"),
+    )
+    lines += _histogram_lines(
+        "wellthier_http_request_db_queries", "SQL statements per HTTP request",
+        m.queries, ("method", "route"),
+    )
+    lines += _histogram_lines(
+        "wellthier_http_request_db_seconds", "Time spent in SQL statements per HTTP request",
+        m.db_time, ("method", "route"),
+    )
+    lines += [
+        "# TYPE wellthier_background_db_queries_total counter",
+        f"wellthier_background_db_queries_total {m.background_queries}",
+        "# TYPE wellthier_background_db_seconds_total counter",
+        f"wellthier_background_db_seconds_total {m.background_db_time}",
+    ]
+    for component, stats in gauges.items():
+        for key, value in stats.items():
+            if isinstance(value, bool):
+                value = int(value)
+            if isinstance(value, (int, float)):
+                lines.append(f"wellthier_{component}_{key} {value}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,345 @@
+import asyncio
+import logging
+import math
+import time
+import uuid
+from datetime import datetime, timezone
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert
+
+from app.config import settings
+from app.db.database import AsyncSessionLocal
+from app.models.user_last_seen import UserLastSeen
+
+logger = logging.getLogger(__name__)
+
+
+class RedisPresenceStore:
+    """Online state shared by every worker (used when SOCKETIO_REDIS_URL is set).
+
+    `<prefix>:<participant>` is a sorted set of the workers that have the
+    participant connected, scored by when each claim lapses. Workers renew their
+    claims every broadcast interval, so a crashed worker's claims expire after
+    `ttl` without any cleanup.
+    """
+
+    def __init__(self, url: str, ttl: float, prefix: str = "wellthier:presence"):
+        import redis.asyncio as redis
+
+        self._redis = redis.from_url(url)
+        self.ttl = ttl
+        self.worker_id = uuid.uuid4().hex
+        self._prefix = prefix
+
+    def _key(self, participant: str) -> str:
+        return f"{self._prefix}:{participant}"
+
+    async def claim(self, participants):
+        if not participants:
+            return
+        lapses = time.time() + self.ttl
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for participant in participants:
+                pipe.zadd(self._key(participant), {self.worker_id: lapses})
+                pipe.expire(self._key(participant), math.ceil(self.ttl) * 2)
+            await pipe.execute()
+
+    async def release(self, participants):
+        if not participants:
+            return
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for participant in participants:
+                pipe.zrem(self._key(participant), self.worker_id)
+            await pipe.execute()
+
+    async def online(self, participants) -> set:
+        """The subset of `participants` with a live claim on any worker."""
+        participants = list(participants)
+        if not participants:
+            return set()
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for participant in participants:
+                pipe.zcount(self._key(participant), time.time(), "+inf")
+            counts = await pipe.execute()
+        return {p for p, count in zip(participants, counts) if count}
+
+
+class PresenceTracker:
+    """Online / offline state of chat participants connected to this process.
+
+    A participant is online while it has at least one socket; after its last
+    socket closes it stays online for a grace period so reconnects and page
+    reloads are invisible. With a `store` the online state is shared across
+    workers: a worker only announces "offline" once no worker has the
+    participant connected, and Redis errors fall back to this worker's view.
+
+    State changes are collected and broadcast once per interval, only when the
+    state differs from what was last announced, so a flapping client costs at
+    most one broadcast per interval. Last-seen times are kept in memory and
+    upserted in one statement per flush.
+
+    `broadcast(participant, status, last_seen)` is set by the Socket.IO layer.
+    """
+
+    def __init__(self, grace: float, broadcast_interval: float, flush_interval: float, store=None):
+        self.grace = grace
+        self.broadcast_interval = broadcast_interval
+        self.flush_interval = flush_interval
+        self.store = store
+        self.broadcast = None
+        self._sids = {}            # participant -> open sids
+        self._online = set()       # connected or within the grace period
+        self._offline_timers = {}  # participant -> grace TimerHandle
+        self._announced = set()    # participants last broadcast as online
+        self._changed = set()
+        self._last_seen = {}       # participant -> datetime not yet written
+        self._task = None
+        self.broadcasts = 0
+        self.suppressed = 0
+        self.last_seen_writes = 0
+        self.store_errors = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def _ensure_running(self):
+        if not self.running:
+            self._task = asyncio.create_task(self._run())
+
+    async def start(self):
+        self._ensure_running()
+
+    async def stop(self):
+        """Stop broadcasting and record everyone still connected as last seen now."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        for timer in self._offline_timers.values():
+            timer.cancel()
+        if self.store is not None:
+            try:
+                await self.store.release(self._online)
+            except Exception:
+                self.store_errors += 1
+                logger.exception("Releasing presence claims failed")
+        now = datetime.now(timezone.utc)
+        for participant in self._online:
+            self._last_seen[participant] = now
+        await self.flush_last_seen()
+
+    def connected(self, participant: str, sid: str):
+        self._ensure_running()
+        self._sids.setdefault(participant, set()).add(sid)
+        timer = self._offline_timers.pop(participant, None)
+        if timer is not None:
+            timer.cancel()
+        if participant not in self._online:
+            self._online.add(participant)
+            self._changed.add(participant)
+
+    def disconnected(self, participant: str, sid: str):
+        sids = self._sids.get(participant)
+        if sids is None:
+            return
+        sids.discard(sid)
+        if sids:
+            return
+        del self._sids[participant]
+        loop = asyncio.get_running_loop()
+        self._offline_timers[participant] = loop.call_later(self.grace, self._went_offline, participant)
+
+    def _went_offline(self, participant: str):
+        self._offline_timers.pop(participant, None)
+        if participant in self._sids:
+            return
+        self._online.discard(participant)
+        self._changed.add(participant)
+        self._last_seen[participant] = datetime.now(timezone.utc)
+
+    async def is_online(self, participant: str) -> bool:
+        if participant in self._online:
+            return True
+        return participant in await self._online_elsewhere([participant])
+
+    async def _online_elsewhere(self, participants) -> set:
+        if self.store is None:
+            return set()
+        try:
+            return await self.store.online(participants)
+        except Exception:
+            self.store_errors += 1
+            logger.exception("Reading shared presence failed")
+            return set()
+
+    async def last_seen(self, participant: str) -> datetime | None:
+        pending = self._last_seen.get(participant)
+        if pending is not None:
+            return pending
+        async with AsyncSessionLocal() as db:
+            return await db.scalar(
+                select(UserLastSeen.last_seen_at).filter(UserLastSeen.participant_id == participant)
+            )
+
+    async def _run(self):
+        last_flush = time.monotonic()
+        while True:
+            await asyncio.sleep(self.broadcast_interval)
+            await self._broadcast_changes()
+            if time.monotonic() - last_flush >= self.flush_interval:
+                last_flush = time.monotonic()
+                await self.flush_last_seen()
+
+    async def _sync_store(self, changed: set) -> set:
+        """Renew this worker's claims, drop those it no longer holds, and return
+        the changed participants still connected to another worker."""
+        if self.store is None:
+            return set()
+        gone = {p for p in changed if p not in self._online}
+        try:
+            await self.store.claim(self._online)
+            await self.store.release(gone)
+        except Exception:
+            self.store_errors += 1
+            logger.exception("Updating shared presence failed")
+        return await self._online_elsewhere(gone)
+
+    async def _broadcast_changes(self):
+        changed, self._changed = self._changed, set()
+        elsewhere = await self._sync_store(changed)
+        for participant in changed:
+            online = participant in self._online
+            if participant in elsewhere:
+                # Left this worker but still connected to another: not offline,
+                # and that worker announces it when it really goes
+                self._announced.discard(participant)
+                self.suppressed += 1
+                continue
+            # Went offline and came back (or the reverse) within one interval
+            if online == (participant in self._announced):
+                self.suppressed += 1
+                continue
+            if online:
+                self._announced.add(participant)
+            else:
+                self._announced.discard(participant)
+            if self.broadcast is None:
+                continue
+            try:
+                await self.broadcast(participant, "online" if online else "offline", self._last_seen.get(participant))
+                self.broadcasts += 1
+            except Exception:
+                logger.exception("Presence broadcast for %s failed", participant)
+
+    async def flush_last_seen(self):
+        if not self._last_seen:
+            return
+        batch, self._last_seen = self._last_seen, {}
+        # executemany keeps a mass disconnect under Postgres' bind parameter limit
+        stmt = insert(UserLastSeen)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[UserLastSeen.participant_id],
+            set_={"last_seen_at": func.greatest(UserLastSeen.last_seen_at, stmt.excluded.last_seen_at)},
+        )
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.execute(stmt, [{"participant_id": p, "last_seen_at": seen} for p, seen in batch.items()])
+                await db.commit()
+            self.last_seen_writes += len(batch)
+        except Exception:
+            # Keep them for the next flush, without overwriting newer times
+            for participant, seen in batch.items():
+                self._last_seen.setdefault(participant, seen)
+            logger.exception("Writing %d last-seen times failed", len(batch))
+
+    def stats(self) -> dict:
+        return {
+            "online": len(self._online),
+            "connected": len(self._sids),
+            "connections": sum(len(sids) for sids in self._sids.values()),
+            "in_grace_period": len(self._offline_timers),
+            "pending_last_seen": len(self._last_seen),
+            "broadcasts": self.broadcasts,
+            "suppressed": self.suppressed,
+            "last_seen_writes": self.last_seen_writes,
+            "shared": self.store is not None,
+            "store_errors": self.store_errors,
+        }
+
+
+class TypingThrottle:
+    """Per (sid, room) typing state.
+
+    `start` returns True when a "typing" event should go out: the first keystroke,
+    then at most once per throttle window while typing continues. A sender that
+    goes quiet for `timeout` seconds is stopped automatically through `on_timeout`.
+    """
+
+    def __init__(self, throttle: float, timeout: float):
+        self.throttle = throttle
+        self.timeout = timeout
+        self.on_timeout = None
+        self._state = {}  # (sid, room) -> [last emit (monotonic), timeout TimerHandle]
+        self._tasks = set()
+        self.suppressed = 0
+
+    def start(self, sid: str, room: str) -> bool:
+        key = (sid, room)
+        now = time.monotonic()
+        timer = asyncio.get_running_loop().call_later(self.timeout, self._timed_out, key)
+        state = self._state.get(key)
+        if state is not None:
+            state[1].cancel()
+            state[1] = timer
+            if now - state[0] < self.throttle:
+                self.suppressed += 1
+                return False
+            state[0] = now
+            return True
+        self._state[key] = [now, timer]
+        return True
+
+    def stop(self, sid: str, room: str) -> bool:
+        """True if the sender was typing, i.e. a stop event should go out."""
+        state = self._state.pop((sid, room), None)
+        if state is None:
+            return False
+        state[1].cancel()
+        return True
+
+    def drop_sid(self, sid: str) -> list:
+        """Forget a closed socket; returns the rooms it was typing in."""
+        rooms = [room for (s, room) in self._state if s == sid]
+        for room in rooms:
+            self.stop(sid, room)
+        return rooms
+
+    def _timed_out(self, key):
+        if self._state.pop(key, None) is None or self.on_timeout is None:
+            return
+        task = asyncio.create_task(self.on_timeout(*key))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+
+def _build_store():
+    # Workers sharing Socket.IO rooms through Redis must share presence too
+    if not settings.SOCKETIO_REDIS_URL:
+        return None
+    ttl = max(3 * settings.PRESENCE_BROADCAST_INTERVAL_MS / 1000, 1.0)
+    return RedisPresenceStore(settings.SOCKETIO_REDIS_URL, ttl=ttl, prefix=f"{settings.SOCKETIO_CHANNEL}:presence")
+
+
+presence = PresenceTracker(
+    grace=settings.PRESENCE_GRACE_SECONDS,
+    broadcast_interval=settings.PRESENCE_BROADCAST_INTERVAL_MS / 1000,
+    flush_interval=settings.LAST_SEEN_FLUSH_SECONDS,
+    store=_build_store(),
+)
+
+typing_throttle = TypingThrottle(
+    throttle=settings.TYPING_THROTTLE_SECONDS,
+    timeout=settings.TYPING_TIMEOUT_SECONDS,
+)
@@ -0,0 +1,136 @@
+import asyncio
+import logging
+
+from sqlalchemy import and_, case, func, or_, tuple_
+from sqlalchemy.dialects.postgresql import insert
+
+from app.config import settings
+from app.db.database import AsyncSessionLocal
+from app.models.chat_read_state import ChatReadState
+
+logger = logging.getLogger(__name__)
+
+KINDS = ("delivered", "seen")
+
+
+def _advance(stmt, kind: str):
+    """ON CONFLICT assignments that move a (<kind>_at, <kind>_id) mark forward only."""
+    at, mark_id = getattr(ChatReadState, f"{kind}_at"), getattr(ChatReadState, f"{kind}_id")
+    new_at, new_id = getattr(stmt.excluded, f"{kind}_at"), getattr(stmt.excluded, f"{kind}_id")
+    newer = and_(new_at.isnot(None), or_(at.is_(None), tuple_(new_at, new_id) > tuple_(at, mark_id)))
+    return {
+        f"{kind}_at": case((newer, new_at), else_=at),
+        f"{kind}_id": case((newer, new_id), else_=mark_id),
+    }
+
+
+class ReceiptBuffer:
+    """Coalesces delivered / seen acks into per (room, participant) watermarks.
+
+    Acks only move the in-memory marks forward, so any number of acks for a
+    room costs one row upsert and one "receipt" broadcast per flush interval.
+
+    `broadcast(room, participant, marks)` is set by the Socket.IO layer.
+    """
+
+    def __init__(self, flush_interval: float):
+        self.flush_interval = flush_interval
+        self.broadcast = None
+        self._pending = {}  # (room, participant) -> {kind: (created_at, message_id)}
+        self._task = None
+        self.acks = 0
+        self.rows_written = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def _ensure_running(self):
+        if not self.running:
+            self._task = asyncio.create_task(self._run())
+
+    async def start(self):
+        self._ensure_running()
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    def ack(self, room: str, participant: str, kind: str, created_at, message_id):
+        """Record that `participant` has `kind` every message of `room` up to (created_at, message_id)."""
+        self._ensure_running()
+        self.acks += 1
+        marks = self._pending.setdefault((room, participant), {})
+        mark = (created_at, message_id)
+        # Seen implies delivered
+        for k in (("delivered", "seen") if kind == "seen" else ("delivered",)):
+            if k not in marks or mark > marks[k]:
+                marks[k] = mark
+
+    def pending_mark(self, room: str, participant: str, kind: str):
+        return self._pending.get((room, participant), {}).get(kind)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def flush(self):
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, {}
+
+        if self.broadcast is not None:
+            for (room, participant), marks in batch.items():
+                try:
+                    await self.broadcast(room, participant, marks)
+                except Exception:
+                    logger.exception("Receipt broadcast for %s in %s failed", participant, room)
+
+        rows = []
+        for (room, participant), marks in batch.items():
+            row = {"room": room, "participant_id": participant}
+            for kind in KINDS:
+                created_at, message_id = marks.get(kind, (None, None))
+                row[f"{kind}_at"], row[f"{kind}_id"] = created_at, message_id
+            rows.append(row)
+        # executemany, not one multi-VALUES statement: 6 binds per row would pass
+        # Postgres' 32767 parameter limit after ~5400 pending watermarks
+        stmt = insert(ChatReadState)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[ChatReadState.room, ChatReadState.participant_id],
+            set_={**_advance(stmt, "delivered"), **_advance(stmt, "seen"), "updated_at": func.now()},
+        )
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.execute(stmt, rows)
+                await db.commit()
+        except Exception:
+            self.failed_flushes += 1
+            logger.exception("Writing %d receipt watermarks failed", len(rows))
+            # Merge back behind anything acked since, for the next flush
+            for key, marks in batch.items():
+                pending = self._pending.setdefault(key, {})
+                for kind, mark in marks.items():
+                    if kind not in pending or mark > pending[kind]:
+                        pending[kind] = mark
+            return
+        self.flushes += 1
+        self.rows_written += len(rows)
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "acks": self.acks,
+            "rows_written": self.rows_written,
+            "flushes": self.flushes,
+            "failed_flushes": self.failed_flushes,
+        }
+
+
+receipt_buffer = ReceiptBuffer(flush_interval=settings.RECEIPT_FLUSH_INTERVAL_MS / 1000)
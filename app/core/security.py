@@ -1,5 +1,11 @@
+from dataclasses import dataclass, field
+import threading
+import time
 from passlib.context import CryptContext
 from datetime import datetime, timedelta
+from cachetools import TLRUCache
+from fastapi import Depends, HTTPException, status
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from jose import jwt, JWTError
 from app.config import settings
 
@@ -22,9 +28,97 @@ def create_access_token(data: dict, expires_delta: int = None):
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
-def decode_access_token(token: str):
+
+class InvalidTokenError(Exception):
+    """Raised when a JWT fails signature or expiry validation."""
+
+
+def _optional_int(value):
+    return int(value) if value not in (None, "") else None
+
+
+@dataclass(frozen=True)
+class Principal:
+    """The authenticated caller, built once per token from its verified claims."""
+    expires_at: float
+    auth_id: int | None = None
+    userid: int | None = None
+    nutritionist_id: int | None = None
+    email: str | None = None
+    role: str | None = None
+    claims: dict = field(default_factory=dict, compare=False, repr=False)
+
+    @classmethod
+    def from_claims(cls, claims: dict) -> "Principal":
+        # Tokens without exp are still re-verified periodically
+        expires_at = claims.get("exp") or time.time() + ACCESS_TOKEN_EXPIRE_MINUTES * 60
+        return cls(
+            expires_at=float(expires_at),
+            auth_id=_optional_int(claims.get("auth_id")),
+            userid=_optional_int(claims.get("userid")),
+            nutritionist_id=_optional_int(claims.get("nutritionist_id")),
+            email=claims.get("email"),
+            role=claims.get("role"),
+            claims=claims,
+        )
+
+
+# Verified tokens -> Principal, each entry evicted when its token expires.
+# cachetools caches are not thread-safe and verify_token may be called from
+# worker threads, so every access holds the lock.
+_principal_cache = TLRUCache(
+    maxsize=settings.JWT_CACHE_MAXSIZE,
+    ttu=lambda _token, principal, _now: principal.expires_at,
+    timer=time.time,
+)
+_principal_cache_lock = threading.Lock()
+
+
+def verify_token(token: str) -> Principal:
+    with _principal_cache_lock:
+        principal = _principal_cache.get(token)
+    if principal is not None:
+        return principal
     try:
-        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        principal = Principal.from_claims(claims)
     except JWTError:
-        raise Exception("Invalid or expired token")
+        raise InvalidTokenError("Invalid or expired token")
+    except (TypeError, ValueError):
+        # Signed, but with a non-numeric id or exp claim
+        raise InvalidTokenError("Malformed token claims")
+    with _principal_cache_lock:
+        _principal_cache[token] = principal
+    return principal
+
+
+def decode_access_token(token: str):
+    return verify_token(token).claims
+
+
+_bearer_scheme = HTTPBearer(auto_error=False)
+
+
+# Dependencies are async so they run on the event loop, not in the threadpool
+async def get_current_principal(
+    credentials: HTTPAuthorizationCredentials | None = Depends(_bearer_scheme),
+) -> Principal:
+    """FastAPI dependency: validate the bearer token (cached) and return its Principal"""
+    if credentials is None or credentials.scheme.lower() != "bearer":
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Missing bearer token")
+    try:
+        return verify_token(credentials.credentials.strip())
+    except InvalidTokenError:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+
+
+async def require_nutritionist(principal: Principal = Depends(get_current_principal)) -> Principal:
+    if not principal.nutritionist_id:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token: nutritionist_id missing")
+    return principal
+
 
+async def require_client(principal: Principal = Depends(get_current_principal)) -> Principal:
+    if not principal.userid:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token: userid missing")
+    return principal
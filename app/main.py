@@ -1,3 +1,4 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 import socketio
 import os
@@ -8,12 +9,41 @@ from app.db.database import engine,Base
 from app.api import user_weight_logs
 from app.api import analytics
 from app.api import sleep_log
+from app.api import admin
+from app.api import chat
+from app.core.email import otp_mailer
+from app.core.message_buffer import chat_buffer
+from app.core.presence import presence
+from app.core.receipts import receipt_buffer
+from app.core.logging import RequestIdMiddleware, setup_logging, stop_logging
+from app.core.metrics import MetricsMiddleware, instrument_engine
 
+setup_logging()
+instrument_engine(engine)
 
 
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await otp_mailer.start()
+    await chat_buffer.start()
+    await presence.start()
+    await receipt_buffer.start()
+    yield
+    # Deliver queued OTPs, save buffered chat messages, last-seen times and receipts before the worker exits
+    await otp_mailer.stop()
+    await chat_buffer.stop()
+    await presence.stop()
+    await receipt_buffer.stop()
+    await engine.dispose()
+    stop_logging()
+
+
 # app = FastAPI()
-fastapi_app = FastAPI()
+fastapi_app = FastAPI(lifespan=lifespan)
+fastapi_app.add_middleware(RequestIdMiddleware)
+fastapi_app.add_middleware(MetricsMiddleware)
 
 @fastapi_app.get("/api/health")
 async def read_root():
@@ -28,6 +58,9 @@ fastapi_app.include_router(auth.router)
 fastapi_app.include_router(user_weight_logs.router)
 fastapi_app.include_router(analytics.router)
 fastapi_app.include_router(sleep_log.router)
+fastapi_app.include_router(chat.router)
+fastapi_app.include_router(admin.router)
+fastapi_app.include_router(admin.metrics_router)
 
 
 
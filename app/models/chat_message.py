@@ -0,0 +1,29 @@
+import uuid
+
+from sqlalchemy import Column, String, Text, DateTime, Index
+from sqlalchemy.dialects.postgresql import UUID
+from app.db.database import Base
+
+
+class ChatMessage(Base):
+    """A chat message sent through Socket.IO.
+
+    Rows are written in batches by the chat write-behind buffer, so `id` and
+    `created_at` are assigned when the message is received, not when it is flushed.
+    """
+    __tablename__ = "chat_message"
+    __table_args__ = (
+        # Keyset history pages: seek on (room, created_at, id), newest first
+        Index(
+            "ix_chat_message_room_created_at_id",
+            "room", "created_at", "id",
+            postgresql_include=["sender_id"],
+        ),
+    )
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    room = Column(String(100), nullable=False)
+    sender_id = Column(String(50), nullable=False)
+    receiver_id = Column(String(50), nullable=True)
+    text = Column(Text, nullable=False)
+    created_at = Column(DateTime(timezone=True), nullable=False)
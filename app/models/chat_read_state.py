@@ -0,0 +1,22 @@
+from sqlalchemy import Column, String, DateTime
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.sql import func
+from app.db.database import Base
+
+
+class ChatReadState(Base):
+    """Receipt watermarks of one participant in one chat room.
+
+    Instead of a row per message, each participant keeps the (created_at, id) of
+    the newest message delivered to / seen by them; every message at or before
+    the mark counts as delivered / seen. Written in batches by the receipt buffer.
+    """
+    __tablename__ = "chat_read_state"
+
+    room = Column(String(100), primary_key=True)
+    participant_id = Column(String(20), primary_key=True)
+    delivered_at = Column(DateTime(timezone=True), nullable=True)
+    delivered_id = Column(UUID(as_uuid=True), nullable=True)
+    seen_at = Column(DateTime(timezone=True), nullable=True)
+    seen_id = Column(UUID(as_uuid=True), nullable=True)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
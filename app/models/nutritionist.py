@@ -49,9 +49,9 @@
 
 
 
-from sqlalchemy import Column, Integer, String, Text, LargeBinary, Boolean, Date, Numeric
+from sqlalchemy import Column, Integer, String, Text, LargeBinary, Boolean, Date, Numeric, select
 from app.db.database import Base
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 import random
 
 
@@ -103,7 +103,7 @@ def generate_refer_code() -> str:
     return f"{random.randint(100000, 999999)}"
 
 
-def generate_unique_refer_code(db_session: Session) -> str:
+async def generate_unique_refer_code(db_session: AsyncSession) -> str:
     """Generate a referral code and ensure uniqueness against nutritionist.referralcode.
 
     Attempts up to 10 times before returning the last generated code.
@@ -111,7 +111,7 @@ def generate_unique_refer_code(db_session: Session) -> str:
     code = generate_refer_code()
     attempts = 0
     while attempts < 10:
-        existing = db_session.query(Nutritionist).filter_by(referralcode=code).first()
+        existing = await db_session.scalar(select(Nutritionist).filter_by(referralcode=code))
         if not existing:
             return code
         code = generate_refer_code()
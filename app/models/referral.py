@@ -1,4 +1,4 @@
-from sqlalchemy import Column, ForeignKey, Integer, DateTime
+from sqlalchemy import Column, ForeignKey, Index, Integer, DateTime
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.sql import func
 from app.db.database import Base
@@ -7,6 +7,10 @@ import uuid
 
 class ClientNutritionistReferral(Base):
     __tablename__ = "client_nutritionist_referral"
+    __table_args__ = (
+        Index("ix_client_nutritionist_referral_nutritionist_id", "nutritionist_id", "userid"),
+        Index("ix_client_nutritionist_referral_userid", "userid"),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     userid = Column(Integer, ForeignKey("userprofile.userid", ondelete="CASCADE"), nullable=False)
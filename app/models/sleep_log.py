@@ -3,13 +3,18 @@ from sqlalchemy import (
     Integer,
     String,
     ForeignKey,
-    DateTime
+    DateTime,
+    Index
 )
 from sqlalchemy.sql import func
 from app.db.database import Base
 
 class SleepLog(Base):
     __tablename__ = "sleep_log"
+    __table_args__ = (
+        Index("ix_sleep_log_userid_start_time", "userid", "start_time"),
+        Index("ix_sleep_log_userid_end_time", "userid", "end_time"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     userid = Column(Integer, ForeignKey("userprofile.userid", ondelete="CASCADE"), nullable=False)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Boolean, DateTime, Text, Integer
+from sqlalchemy import Column, String, Boolean, DateTime, Text, Integer, Index
 from app.db.database import Base
 from sqlalchemy.sql import func
 from sqlalchemy.dialects.postgresql import UUID
@@ -20,6 +20,9 @@ class User(Base):
 
 class OTP(Base):
     __tablename__ = 'otp'
+    __table_args__ = (
+        Index("ix_otp_username_otp_code", "username", "otp_code"),
+    )
    
     id = Column(Integer, primary_key=True)
     username = Column(String(150), nullable=False)
@@ -4,6 +4,10 @@ from sqlalchemy.sql import func, text
 from app.db.database import Base
 
 
+# Leap-year independent day-of-year key (MMDD, e.g. 1231) for birthday lookups.
+BIRTHDAY_KEY_SQL = "(EXTRACT(MONTH FROM birthdate) * 100 + EXTRACT(DAY FROM birthdate))"
+
+
 class UserProfile(Base):
     __tablename__ = 'userprofile'
 
@@ -12,7 +16,7 @@ class UserProfile(Base):
     birthdate = Column(Date, nullable=False)
     gender = Column(String(10), nullable=False)
     mobile = Column(String(10), nullable=False)
-    email = Column(String(50), nullable=False)
+    email = Column(String(50), nullable=False, index=True)
     address = Column(String(150), nullable=True)
     city = Column(String(30), nullable=True)
     state = Column(String(30), nullable=True)
@@ -29,7 +33,7 @@ class UserProfile(Base):
     mealplanid = Column(Integer, nullable=True)
     subscriptionplanid = Column(Integer, nullable=True)
     nutritionistid = Column(Integer, nullable=True)
-    userauthenticationid = Column(Integer, ForeignKey('userauthentication.userauthenticationid', ondelete='CASCADE'), nullable=True)
+    userauthenticationid = Column(Integer, ForeignKey('userauthentication.userauthenticationid', ondelete='CASCADE'), nullable=True, index=True)
     lastlogin = Column(DateTime)
 
     
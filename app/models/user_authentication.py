@@ -6,4 +6,4 @@ class UserAuthentication(Base):
     __tablename__ = "userauthentication"
 
     userauthenticationid = Column(Integer, primary_key=True, autoincrement=True)
-    loginid = Column(String(75), nullable=True)
\ No newline at end of file
+    loginid = Column(String(75), nullable=True, index=True)
\ No newline at end of file
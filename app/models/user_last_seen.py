@@ -0,0 +1,14 @@
+from sqlalchemy import Column, String, DateTime
+from app.db.database import Base
+
+
+class UserLastSeen(Base):
+    """When a chat participant was last connected, written in batches by the presence tracker.
+
+    `participant_id` is "u<userid>" for clients and "n<nutritionist_id>" for nutritionists,
+    the same identity used in chat rooms.
+    """
+    __tablename__ = "user_last_seen"
+
+    participant_id = Column(String(20), primary_key=True)
+    last_seen_at = Column(DateTime(timezone=True), nullable=False)
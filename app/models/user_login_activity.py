@@ -0,0 +1,17 @@
+from sqlalchemy import Column, Integer, SmallInteger, Date, DateTime, ForeignKey
+from app.db.database import Base
+
+
+class UserLoginActivity(Base):
+    """Per user, per day, per hour login counts rolled up from user_login_history.
+
+    `activity_date` / `hour` are taken from `login_time` as stored (server local time),
+    so they bucket exactly like EXTRACT(...) on the raw history would.
+    """
+    __tablename__ = "user_login_activity"
+
+    userid = Column(Integer, ForeignKey("userprofile.userid", ondelete="CASCADE"), primary_key=True)
+    activity_date = Column(Date, primary_key=True)
+    hour = Column(SmallInteger, primary_key=True)  # 0-23
+    login_count = Column(Integer, nullable=False, default=0)
+    last_login_time = Column(DateTime, nullable=False)  # latest login inside this bucket
@@ -1,9 +1,12 @@
-from sqlalchemy import Column, Integer, DateTime, ForeignKey, func, Text
+from sqlalchemy import Column, Integer, DateTime, ForeignKey, Index, func, Text
 from app.db.database import Base
 
 
 class UserLoginHistory(Base):
     __tablename__ = "user_login_history"
+    __table_args__ = (
+        Index("ix_user_login_history_userid_login_time", "userid", "login_time"),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     userid = Column(Integer, ForeignKey("userprofile.userid", ondelete="CASCADE"))
@@ -1,6 +1,6 @@
 from sqlalchemy import (
     Column, Integer, BigInteger, String, Text, Time, Date, Boolean,
-    DateTime, Numeric, ForeignKey
+    DateTime, Numeric, ForeignKey, Index
 )
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.sql import func
@@ -9,6 +9,11 @@ from app.db.database import Base  # adapt import path
 
 class UserWeightLog(Base):
     __tablename__ = 'user_weight_log'
+    __table_args__ = (
+        Index("ix_user_weight_log_userid_entry_date", "userid", "entry_date", "created_at"),
+        # Idempotency key for bulk imports: a retried upload cannot insert an entry twice
+        Index("uq_user_weight_log_userid_client_id", "userid", "client_id", unique=True),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     userid = Column(Integer, ForeignKey('userprofile.userid', ondelete='CASCADE'), nullable=False)
@@ -16,3 +21,4 @@ class UserWeightLog(Base):
     unit = Column(String(5), default='kg')
     entry_date = Column(Date, default=func.now())
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    client_id = Column(String(64), nullable=True)
@@ -26,5 +26,22 @@ class SleepLogResponse(BaseModel):
 # ---------- Chart / Summary ----------
 class SleepSummaryResponse(BaseModel):
     mode: str
+    timezone: str = "UTC"
     labels: List[str]
     values: List[int]
+
+
+# ---------- Batch Ingest ----------
+class SleepBatchItemResult(BaseModel):
+    index: int
+    status: str  # created / duplicate / exists / invalid
+    id: Optional[int] = None
+    error: Optional[str] = None
+
+
+class SleepBatchResponse(BaseModel):
+    received: int
+    created: int
+    skipped: int
+    invalid: int
+    results: List[SleepBatchItemResult]
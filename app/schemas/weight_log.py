@@ -1,8 +1,37 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, field_validator
+from datetime import date
 from decimal import Decimal
-from typing import Optional
+from typing import List, Optional
 
 class WeightUpdateRequest(BaseModel):
     startingweight: Optional[Decimal] = None
     targetweight: Optional[Decimal] = None
     unit: Optional[str] = "kg"
+
+
+class WeightLogBulkItem(BaseModel):
+    weight: Decimal = Field(..., gt=0)
+    unit: str = "kg"
+    entry_date: Optional[date] = None  # defaults to today
+    client_id: str = Field(..., min_length=1, max_length=64)  # idempotency key, unique per user
+
+    @field_validator("unit")
+    @classmethod
+    def normalize_unit(cls, v: str) -> str:
+        v = v.lower()
+        if v not in ("kg", "lbs"):
+            raise ValueError("unit must be kg or lbs")
+        return v
+
+
+class WeightLogBulkItemResult(BaseModel):
+    client_id: str
+    id: int
+    status: str  # created / duplicate
+
+
+class WeightLogBulkResponse(BaseModel):
+    received: int
+    created: int
+    duplicates: int
+    results: List[WeightLogBulkItemResult]
@@ -0,0 +1,90 @@
+"""
+Rebuild the user_login_activity rollup from user_login_history.
+
+    python -m app.scripts.backfill_login_activity [--since YYYY-MM-DD] [--chunk-days 30]
+
+Only hours that ended before a cutoff (the start of the hour CUTOFF_MARGIN
+ago) are rebuilt. No login transaction can still be writing to those buckets,
+so each one is set to its exact count from history, and re-running is safe.
+Buckets from the cutoff on belong to the live writes in record_login_activity.
+They are only complete once live writes have been deployed for a full hour, so
+run this (or re-run it) after that.
+"""
+import argparse
+import asyncio
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import text
+
+from app.db.database import engine
+from app.models.userProfile import UserProfile  # noqa: F401 - FK target for create()
+from app.models.user_login_activity import UserLoginActivity
+
+# No login request is still uncommitted this long after its login_time
+CUTOFF_MARGIN = timedelta(minutes=5)
+
+_BACKFILL_CHUNK = text("""
+    INSERT INTO user_login_activity (userid, activity_date, hour, login_count, last_login_time)
+    SELECT
+        userid,
+        login_time::date,
+        EXTRACT(HOUR FROM login_time)::smallint,
+        COUNT(*),
+        MAX(login_time)
+    FROM user_login_history
+    WHERE userid IS NOT NULL
+      AND login_time >= :chunk_start
+      AND login_time < :chunk_end
+    GROUP BY 1, 2, 3
+    ON CONFLICT (userid, activity_date, hour) DO UPDATE SET
+        login_count = EXCLUDED.login_count,
+        last_login_time = EXCLUDED.last_login_time
+""")
+
+
+async def backfill(since: date | None, chunk_days: int):
+    async with engine.begin() as conn:
+        await conn.run_sync(lambda sync_conn: UserLoginActivity.__table__.create(sync_conn, checkfirst=True))
+        bounds = (await conn.execute(text(
+            "SELECT MIN(login_time)::date, MAX(login_time)::date FROM user_login_history"
+        ))).one()
+
+    if bounds[0] is None:
+        print("user_login_history is empty, nothing to backfill")
+        return
+
+    # login_time is server local time, as written by verify_login_otp
+    cutoff = (datetime.now() - CUTOFF_MARGIN).replace(minute=0, second=0, microsecond=0)
+    print(f"rebuilding buckets before {cutoff:%Y-%m-%d %H:00}; later ones are kept from live writes")
+
+    chunk_start = max(since, bounds[0]) if since else bounds[0]
+    last_day = min(bounds[1], cutoff.date())
+    while chunk_start <= last_day:
+        chunk_end = chunk_start + timedelta(days=chunk_days)
+        # One transaction per chunk keeps locks and WAL bursts small
+        async with engine.begin() as conn:
+            result = await conn.execute(_BACKFILL_CHUNK, {
+                "chunk_start": datetime.combine(chunk_start, datetime.min.time()),
+                "chunk_end": min(datetime.combine(chunk_end, datetime.min.time()), cutoff),
+            })
+        print(f"{chunk_start} .. {chunk_end - timedelta(days=1)}: {result.rowcount} buckets")
+        chunk_start = chunk_end
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--since", type=date.fromisoformat, help="only rebuild logins on or after this date")
+    parser.add_argument("--chunk-days", type=int, default=30, help="days of history per transaction")
+    args = parser.parse_args()
+
+    async def run():
+        try:
+            await backfill(args.since, args.chunk_days)
+        finally:
+            await engine.dispose()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""
+Verify that every hot query path can be served by its index.
+
+    python -m app.scripts.check_index_usage
+
+Runs EXPLAIN (FORMAT JSON) for each router query shape against the configured
+database and exits non-zero if an expected index does not appear in the plan.
+Raw-SQL endpoints are explained from the same query constants (and parameter
+builders) they execute, so the check follows the endpoints as they change;
+ORM lookups are spelled out here. Sequential and bitmap scans are disabled
+for the session and date windows sit at a fixed day before any real data, so
+the plan shows whether the predicate reaches the index rather than how much of
+one user's history a small local database happens to hold.
+"""
+import asyncio
+import json
+import sys
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import TextClause, text
+
+from app.api.analytics import _LAST_LOGIN_DASHBOARD_QUERY, _UPCOMING_BIRTHDAYS_QUERY
+from app.api.sleep_log import _SLEEP_RANGE_QUERY, _SLEEP_SUMMARY_QUERY
+from app.api.user_weight_logs import _WEIGHT_RANGE_QUERY, _WEIGHT_TREND_QUERIES, _weight_window
+from app.db.database import engine
+from app.utils.chat_history import _UNREAD_QUERY, UNREAD_COUNT_CAP
+
+_NOW = datetime.now()
+_TODAY = date.today()
+# "today" for date-windowed queries: a window there is selective for every user
+_WINDOW_DAY = date(2000, 6, 15)
+
+# (description, SQL string or endpoint query, params, expected index names)
+HOT_QUERIES = [
+    (
+        "analytics: last-login dashboard",
+        _LAST_LOGIN_DASHBOARD_QUERY,
+        {
+            "nutritionist_id": 1,
+            "today": _TODAY,
+            "seven_days_ago": _NOW - timedelta(days=7),
+            "thirty_days_ago": _NOW - timedelta(days=30),
+        },
+        ("ix_client_nutritionist_referral_nutritionist_id", "user_login_activity_pkey"),
+    ),
+    (
+        "auth/me: nutritionist of a client",
+        "SELECT nutritionist_id FROM client_nutritionist_referral WHERE userid = :id LIMIT 1",
+        {"id": 1},
+        ("ix_client_nutritionist_referral_userid",),
+    ),
+    (
+        "analytics: upcoming birthdays of a nutritionist's clients",
+        _UPCOMING_BIRTHDAYS_QUERY,
+        {"today": _TODAY, "days": 7, "nutritionist_id": 1},
+        ("ix_client_nutritionist_referral_nutritionist_id", "userprofile_pkey"),
+    ),
+    (
+        "sleep-log summary series (by wake date)",
+        _SLEEP_SUMMARY_QUERY,
+        {
+            "userid": 1, "tz": "UTC", "first": _WINDOW_DAY - timedelta(days=6), "last": _WINDOW_DAY + timedelta(days=1),
+            "buckets": 7, "step_months": 0, "step_days": 1,
+        },
+        ("ix_sleep_log_userid_end_time",),
+    ),
+    (
+        "sleep-log range (by wake date)",
+        _SLEEP_RANGE_QUERY,
+        {"userid": 1, "tz": "UTC", "start": _WINDOW_DAY - timedelta(days=89), "end": _WINDOW_DAY + timedelta(days=1), "bucket": "week"},
+        ("ix_sleep_log_userid_end_time",),
+    ),
+    (
+        "sleep-log latest",
+        "SELECT * FROM sleep_log WHERE userid = :id ORDER BY end_time DESC LIMIT 1",
+        {"id": 1},
+        ("ix_sleep_log_userid_end_time",),
+    ),
+    *(
+        (
+            f"weight-log {mode} trend",
+            query,
+            dict(zip(("start", "end"), _weight_window(mode, _WINDOW_DAY)), userid=1),
+            ("ix_user_weight_log_userid_entry_date",),
+        )
+        for mode, query in _WEIGHT_TREND_QUERIES.items()
+    ),
+    (
+        "weight-log range",
+        _WEIGHT_RANGE_QUERY,
+        {"userid": 1, "start": _WINDOW_DAY - timedelta(days=89), "end": _WINDOW_DAY, "bucket": "week"},
+        ("ix_user_weight_log_userid_entry_date",),
+    ),
+    (
+        "chat history page (keyset)",
+        "SELECT id, sender_id, text, created_at FROM chat_message WHERE room = :room "
+        "AND (created_at, id) < (:ts, CAST(:id AS uuid)) ORDER BY created_at DESC, id DESC LIMIT 51",
+        {"room": "chat_test", "ts": _NOW.astimezone(), "id": "ffffffff-ffff-ffff-ffff-ffffffffffff"},
+        ("ix_chat_message_room_created_at_id",),
+    ),
+    (
+        "chat unread counts after the seen watermarks",
+        _UNREAD_QUERY,
+        {
+            "participant": "u1", "rooms": ["chat_test"], "pending_at": [None], "pending_id": [None],
+            "cap": UNREAD_COUNT_CAP,
+        },
+        ("ix_chat_message_room_created_at_id",),
+    ),
+    (
+        "OTP verification",
+        "SELECT * FROM otp WHERE username = :email AND otp_code = :otp",
+        {"email": "someone@example.com", "otp": "123456"},
+        ("ix_otp_username_otp_code",),
+    ),
+    (
+        "login / signup existence check",
+        "SELECT * FROM userauthentication WHERE loginid = :email",
+        {"email": "someone@example.com"},
+        ("ix_userauthentication_loginid",),
+    ),
+    (
+        "profile by authentication id",
+        "SELECT * FROM userprofile WHERE userauthenticationid = :id",
+        {"id": 1},
+        ("ix_userprofile_userauthenticationid",),
+    ),
+    (
+        "signup duplicate email check",
+        "SELECT * FROM userprofile WHERE email = :email",
+        {"email": "someone@example.com"},
+        ("ix_userprofile_email",),
+    ),
+]
+
+
+def _plan_indexes(node: dict) -> set:
+    found = {node["Index Name"]} if "Index Name" in node else set()
+    for child in node.get("Plans", []):
+        found |= _plan_indexes(child)
+    return found
+
+
+async def check() -> bool:
+    ok = True
+    async with engine.connect() as conn:
+        await conn.execute(text("SET enable_seqscan = off"))
+        await conn.execute(text("SET enable_bitmapscan = off"))
+        for description, sql, params, expected in HOT_QUERIES:
+            if isinstance(sql, TextClause):
+                sql = sql.text
+            raw = (await conn.execute(text(f"EXPLAIN (FORMAT JSON) {sql}"), params)).scalar()
+            plan = (json.loads(raw) if isinstance(raw, str) else raw)[0]["Plan"]
+            used = _plan_indexes(plan)
+            missing = set(expected) - used
+            status = "FAIL" if missing else "ok  "
+            ok = ok and not missing
+            print(f"[{status}] {description}: expected {', '.join(expected)}, plan uses {sorted(used) or 'no index'}")
+    return ok
+
+
+def main():
+    async def run():
+        try:
+            return await check()
+        finally:
+            await engine.dispose()
+
+    sys.exit(0 if asyncio.run(run()) else 1)
+
+
+if __name__ == "__main__":
+    main()
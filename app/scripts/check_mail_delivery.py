@@ -0,0 +1,107 @@
+"""
+Deliver OTP emails through the real queue into a local SMTP sink and check what arrived.
+
+    pip install aiosmtpd
+    python -m app.scripts.check_mail_delivery [--messages 200] [--port 8025]
+
+Starts an aiosmtpd server on localhost, points the mail settings at it (no
+STARTTLS, no login) and queues --messages OTP emails, plus one to a recipient
+the sink refuses with 550 and one it defers once with 451. Exits non-zero
+unless every deliverable email arrived exactly once, the refused one was
+dropped without a retry and the deferred one arrived after a retry.
+"""
+import argparse
+import asyncio
+import sys
+import time
+from collections import Counter
+
+from aiosmtpd.controller import Controller
+
+from app.config import settings
+from app.core.email import OTPMailQueue, build_otp_message
+
+REFUSED = "refused@wellthier.test"
+DEFERRED = "deferred@wellthier.test"
+
+
+class _Sink:
+    def __init__(self):
+        self.received = Counter()
+        self.deferred = set()
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address == REFUSED:
+            return "550 5.1.1 No such user"
+        if address == DEFERRED and address not in self.deferred:
+            self.deferred.add(address)
+            return "451 4.3.0 Try again later"
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        for rcpt in envelope.rcpt_tos:
+            self.received[rcpt] += 1
+        return "250 Message accepted"
+
+
+async def run(args) -> list[str]:
+    settings.MAIL_SERVER, settings.MAIL_PORT = "127.0.0.1", args.port
+    settings.MAIL_USE_TLS, settings.MAIL_PASSWORD = False, None
+    settings.MAIL_USERNAME = settings.MAIL_USERNAME or "otp@wellthier.test"
+
+    sink = _Sink()
+    controller = Controller(sink, hostname="127.0.0.1", port=args.port)
+    controller.start()
+    mailer = OTPMailQueue(
+        workers=settings.MAIL_QUEUE_WORKERS,
+        batch_size=settings.MAIL_BATCH_SIZE,
+        max_retries=settings.MAIL_MAX_RETRIES,
+        retry_backoff=0.1,
+        maxsize=args.messages + 2,
+    )
+    expected = [f"user{i}@wellthier.test" for i in range(args.messages)]
+    try:
+        started = time.perf_counter()
+        for address in [*expected, REFUSED, DEFERRED]:
+            mailer.enqueue(build_otp_message(address, "123456"))
+        while mailer.sent + mailer.failed < len(expected) + 2 and time.perf_counter() - started < args.timeout:
+            await asyncio.sleep(0.05)
+        elapsed = time.perf_counter() - started
+        await mailer.stop()
+    finally:
+        controller.stop()
+
+    stats = mailer.stats()
+    print(f"{stats['sent']} sent in {elapsed:.2f}s ({stats['sent'] / elapsed:.0f}/s); {stats}")
+
+    problems = []
+    wrong = [address for address in expected if sink.received[address] != 1]
+    if wrong:
+        problems.append(f"{len(wrong)} emails not delivered exactly once, e.g. {wrong[0]}: {sink.received[wrong[0]]}")
+    if sink.received[REFUSED] or stats["rejected"] != 1:
+        problems.append(f"refused recipient: {sink.received[REFUSED]} delivered, {stats['rejected']} rejected")
+    if sink.received[DEFERRED] != 1 or stats["retried"] != 1:
+        problems.append(f"deferred recipient: {sink.received[DEFERRED]} delivered, {stats['retried']} retries")
+    if stats["failed"] != 1:
+        problems.append(f"{stats['failed']} failed, expected only the refused recipient")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=200, help="deliverable emails to queue")
+    parser.add_argument("--port", type=int, default=8025, help="port for the local SMTP sink")
+    parser.add_argument("--timeout", type=float, default=30, help="seconds to wait for delivery")
+    args = parser.parse_args()
+
+    problems = asyncio.run(run(args))
+    for problem in problems:
+        print(f"FAIL {problem}")
+    if problems:
+        sys.exit(1)
+    print("mail delivery OK")
+
+
+if __name__ == "__main__":
+    main()
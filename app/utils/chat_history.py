@@ -0,0 +1,171 @@
+import base64
+import uuid
+from datetime import datetime
+
+from sqlalchemy import select, text, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.message_buffer import chat_buffer
+from app.core.receipts import receipt_buffer
+from app.models.chat_message import ChatMessage
+from app.models.chat_read_state import ChatReadState
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def encode_cursor(created_at: datetime, message_id: uuid.UUID) -> str:
+    raw = f"{created_at.isoformat()}|{message_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, uuid.UUID]:
+    """Inverse of encode_cursor; raises ValueError for anything it did not produce."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, message_id = raw.split("|")
+        created_at = datetime.fromisoformat(created_at)
+        if created_at.tzinfo is None:
+            raise ValueError
+        return created_at, uuid.UUID(message_id)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid cursor")
+
+
+def _compact(message) -> dict:
+    return {
+        "id": str(message["id"]),
+        "sender_id": message["sender_id"],
+        "text": message["text"],
+        "created_at": message["created_at"].isoformat(),
+    }
+
+
+async def load_history(db: AsyncSession, room: str, cursor: str | None = None, limit: int = DEFAULT_PAGE_SIZE) -> dict:
+    """
+    One page of a room's messages, newest first, older than `cursor` when given.
+    Seeks on (room, created_at, id) so every page costs the same however deep it is,
+    and includes messages still waiting in the write-behind buffer.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    before = decode_cursor(cursor) if cursor else None
+
+    stmt = (
+        select(ChatMessage.id, ChatMessage.sender_id, ChatMessage.text, ChatMessage.created_at)
+        .filter(ChatMessage.room == room)
+        .order_by(ChatMessage.created_at.desc(), ChatMessage.id.desc())
+        .limit(limit + 1)
+    )
+    if before:
+        stmt = stmt.filter(tuple_(ChatMessage.created_at, ChatMessage.id) < tuple_(*before))
+    rows = [dict(row) for row in (await db.execute(stmt)).mappings()]
+
+    # Buffered messages are not in the table yet (or are being written right now)
+    stored = {row["id"] for row in rows}
+    for message in chat_buffer.pending(room):
+        if message["id"] not in stored and (before is None or (message["created_at"], message["id"]) < before):
+            rows.append(message)
+    rows.sort(key=lambda m: (m["created_at"], m["id"]), reverse=True)
+
+    page = rows[:limit]
+    has_more = len(rows) > limit
+    return {
+        "room": room,
+        "messages": [_compact(m) for m in page],
+        "next_cursor": encode_cursor(page[-1]["created_at"], page[-1]["id"]) if has_more else None,
+    }
+
+
+UNREAD_COUNT_CAP = 999
+
+# Per room: the participant's seen mark (the later of the stored one and an ack
+# not flushed yet) and how many messages from others are newer than it, counting
+# up to the cap. The count is served by the (room, created_at, id) INCLUDE
+# (sender_id) index without touching the heap.
+_UNREAD_QUERY = text("""
+    WITH r AS (
+        SELECT *
+        FROM unnest(CAST(:rooms AS text[]), CAST(:pending_at AS timestamptz[]), CAST(:pending_id AS uuid[]))
+            AS r(room, pending_at, pending_id)
+    ),
+    marks AS (
+        SELECT r.room,
+               CASE WHEN s.seen_at IS NULL OR (r.pending_at, r.pending_id) > (s.seen_at, s.seen_id)
+                    THEN r.pending_at ELSE s.seen_at END AS seen_at,
+               CASE WHEN s.seen_at IS NULL OR (r.pending_at, r.pending_id) > (s.seen_at, s.seen_id)
+                    THEN r.pending_id ELSE s.seen_id END AS seen_id
+        FROM r
+        LEFT JOIN chat_read_state s ON s.room = r.room AND s.participant_id = :participant
+    )
+    SELECT k.room, k.seen_at, k.seen_id,
+           (
+               SELECT COUNT(*) FROM (
+                   SELECT 1
+                   FROM chat_message m
+                   WHERE m.room = k.room
+                     AND m.sender_id <> :participant
+                     AND (k.seen_at IS NULL OR (m.created_at, m.id) > (k.seen_at, k.seen_id))
+                   LIMIT :cap
+               ) newer
+           ) AS unread
+    FROM marks k
+    ORDER BY k.room
+""")
+
+
+def _later(a, b):
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return max(a, b)
+
+
+async def unread_counts(db: AsyncSession, participant: str, rooms) -> dict:
+    """Unread messages per room for a participant, from its seen watermark."""
+    rooms = sorted(rooms)
+    pending = [receipt_buffer.pending_mark(room, participant, "seen") or (None, None) for room in rooms]
+    rows = (
+        await db.execute(
+            _UNREAD_QUERY,
+            {
+                "participant": participant,
+                "rooms": rooms,
+                "pending_at": [at for at, _ in pending],
+                "pending_id": [mark_id for _, mark_id in pending],
+                "cap": UNREAD_COUNT_CAP,
+            },
+        )
+    ).all()
+
+    result = []
+    for row in rows:
+        mark = (row.seen_at, row.seen_id) if row.seen_at else None
+        # Messages still in the write-behind buffer are not in the count yet
+        buffered = sum(
+            1 for m in chat_buffer.pending(row.room)
+            if m["sender_id"] != participant and (mark is None or (m["created_at"], m["id"]) > mark)
+        )
+        result.append({"room": row.room, "unread": min(row.unread + buffered, UNREAD_COUNT_CAP)})
+
+    return {
+        "participant": participant,
+        "rooms": result,
+        "total": sum(r["unread"] for r in result),
+    }
+
+
+def mark_payload(mark) -> dict | None:
+    return {"message_id": str(mark[1]), "created_at": mark[0].isoformat()} if mark else None
+
+
+async def read_marks(db: AsyncSession, room: str, participant: str) -> dict:
+    """A participant's delivered / seen marks in a room, including acks not flushed yet."""
+    state = await db.get(ChatReadState, (room, participant))
+    marks = {}
+    for kind in ("delivered", "seen"):
+        stored = None
+        if state is not None and getattr(state, f"{kind}_at") is not None:
+            stored = (getattr(state, f"{kind}_at"), getattr(state, f"{kind}_id"))
+        marks[kind] = mark_payload(_later(stored, receipt_buffer.pending_mark(room, participant, kind)))
+    return {"participant": participant, **marks}
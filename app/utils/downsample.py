@@ -0,0 +1,71 @@
+from datetime import date, timedelta
+
+BUCKETS = ("day", "week", "month")
+BUCKET_DAYS = {"day": 1, "week": 7, "month": 30}
+
+DEFAULT_RANGE_DAYS = 90
+MAX_RANGE_DAYS = 3660  # 10 years
+
+
+def resolve_range(start: date | None, end: date | None, today: date | None = None) -> tuple[date, date]:
+    """
+    Fill in a missing chart range end (`today`, by default the server's) / start
+    (DEFAULT_RANGE_DAYS before end) and reject inverted or oversized ranges.
+    """
+    end = end or today or date.today()
+    start = start or end - timedelta(days=DEFAULT_RANGE_DAYS - 1)
+
+    if start > end:
+        raise ValueError("'from' must not be after 'to'")
+    if (end - start).days >= MAX_RANGE_DAYS:
+        raise ValueError(f"Range must not exceed {MAX_RANGE_DAYS} days")
+    return start, end
+
+
+def pick_bucket(start: date, end: date, max_points: int) -> str:
+    """Finest bucket size that keeps the range within max_points buckets."""
+    days = (end - start).days + 1
+    for bucket in BUCKETS:
+        if days / BUCKET_DAYS[bucket] <= max_points:
+            return bucket
+    return BUCKETS[-1]
+
+
+def lttb(xs: list, ys: list, threshold: int) -> list[int]:
+    """
+    Largest-Triangle-Three-Buckets: indices of `threshold` points that keep the
+    visual shape of the (xs, ys) series. First and last points are always kept.
+    """
+    n = len(xs)
+    if threshold >= n or threshold < 3:
+        return list(range(n))
+
+    every = (n - 2) / (threshold - 2)
+    selected = [0]
+    a = 0
+    for i in range(threshold - 2):
+        # average of the next bucket is the third corner of the triangle
+        avg_start = int((i + 1) * every) + 1
+        avg_end = min(int((i + 2) * every) + 1, n)
+        avg_x = sum(xs[avg_start:avg_end]) / (avg_end - avg_start)
+        avg_y = sum(ys[avg_start:avg_end]) / (avg_end - avg_start)
+
+        best, best_area = int(i * every) + 1, -1.0
+        for j in range(int(i * every) + 1, int((i + 1) * every) + 1):
+            area = abs((xs[a] - avg_x) * (ys[j] - ys[a]) - (xs[a] - xs[j]) * (avg_y - ys[a]))
+            if area > best_area:
+                best, best_area = j, area
+        selected.append(best)
+        a = best
+
+    selected.append(n - 1)
+    return selected
+
+
+def downsample_points(points: list[dict], max_points: int, value_key: str = "avg") -> list[dict]:
+    """LTTB-reduce bucket dicts (keyed by a `start` date) to at most max_points."""
+    if len(points) <= max_points:
+        return points
+    xs = [p["start"].toordinal() for p in points]
+    ys = [float(p[value_key]) for p in points]
+    return [points[i] for i in lttb(xs, ys, max_points)]
@@ -0,0 +1,28 @@
+from datetime import datetime
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.user_login_activity import UserLoginActivity
+
+
+async def record_login_activity(db: AsyncSession, userid: int, login_time: datetime):
+    """
+    Bump the rollup bucket for a login; runs inside the caller's transaction
+    so the rollup and user_login_history commit together.
+    """
+    stmt = insert(UserLoginActivity).values(
+        userid=userid,
+        activity_date=login_time.date(),
+        hour=login_time.hour,
+        login_count=1,
+        last_login_time=login_time,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[UserLoginActivity.userid, UserLoginActivity.activity_date, UserLoginActivity.hour],
+        set_={
+            "login_count": UserLoginActivity.login_count + 1,
+            "last_login_time": func.greatest(UserLoginActivity.last_login_time, stmt.excluded.last_login_time),
+        },
+    )
+    await db.execute(stmt)
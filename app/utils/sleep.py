@@ -1,3 +1,4 @@
+from bisect import bisect_left
 from datetime import datetime
 
 def calculate_sleep_minutes(start: datetime, end: datetime) -> int:
@@ -11,3 +12,32 @@ def calculate_sleep_minutes(start: datetime, end: datetime) -> int:
         raise ValueError("End time must be after start time")
 
     return minutes
+
+
+def find_overlaps(sessions: list, existing: list) -> list:
+    """
+    Overlap check for a batch of (start, end) sessions against each other and
+    against already stored (start, end) sessions.
+    Returns one entry per session: None to keep it, "exists" if it overlaps a
+    stored session, "duplicate" if it overlaps a kept session of the batch that
+    starts earlier (so the earliest of overlapping sessions wins).
+    """
+    existing = sorted(existing)
+    existing_starts = [start for start, _ in existing]
+    existing_max_end = []
+    for _, end in existing:
+        existing_max_end.append(max(end, existing_max_end[-1]) if existing_max_end else end)
+
+    results = [None] * len(sessions)
+    kept_until = None
+    for i in sorted(range(len(sessions)), key=lambda i: sessions[i]):
+        start, end = sessions[i]
+        # stored sessions starting before this one ends - does any reach past its start?
+        n = bisect_left(existing_starts, end)
+        if n and existing_max_end[n - 1] > start:
+            results[i] = "exists"
+        elif kept_until is not None and start < kept_until:
+            results[i] = "duplicate"
+        else:
+            kept_until = end if kept_until is None else max(kept_until, end)
+    return results
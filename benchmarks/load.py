@@ -0,0 +1,166 @@
+"""
+Drive every router of a running server with a concurrent mixed workload.
+
+    python -m benchmarks.load [--base-url http://localhost:8000] [--concurrency 50] [--duration 60]
+                              [--socket-clients 20] [--save out.json] [--compare benchmarks/baselines/local.json]
+
+Workers pick a weighted-random scenario per request as a random seeded client
+(or that client's nutritionist); Socket.IO clients meanwhile join their chat
+rooms and send messages, timed from emit to ack. Requests finishing during the
+warm-up are not counted. Prints p50 / p95 / p99 and throughput per scenario;
+with --compare, exits 1 if any scenario regressed against the baseline.
+
+POST /auth/login and the OTP flow are left out: they queue emails.
+"""
+import argparse
+import asyncio
+import random
+import time
+from collections import defaultdict
+
+import httpx
+import socketio
+
+from benchmarks import report
+from benchmarks.users import sample_users
+
+# name -> (weight, method, path, caller); paths are formatted with the user dict
+SCENARIOS = {
+    "auth_me": (10, "GET", "/auth/me", "client"),
+    "weight_logs_weekly": (8, "GET", "/weight-log/logs?mode=weekly", "client"),
+    "weight_range": (4, "GET", "/weight-log/range", "client"),
+    "weight_post": (2, "POST", "/weight-log/?weight=72.5&unit=kg", "client"),
+    "sleep_latest": (8, "GET", "/sleep-log/latest", "client"),
+    "sleep_summary_weekly": (6, "GET", "/sleep-log/summary?mode=weekly", "client"),
+    "sleep_range": (4, "GET", "/sleep-log/range", "client"),
+    "clients_last_login": (4, "GET", "/nutritionist/clients/last-login", "nutritionist"),
+    "clients_birthdays": (2, "GET", "/nutritionist/clients/upcoming-birthdays", "nutritionist"),
+    "chat_history": (6, "GET", "/chat/rooms/{room}/messages?limit=50", "client"),
+    "chat_unread": (4, "GET", "/chat/unread", "client"),
+}
+
+SOCKET_SCENARIO = "socket_send_message"
+
+
+class Recorder:
+    def __init__(self, measure_from: float, measure_until: float):
+        self.measure_from = measure_from
+        self.measure_until = measure_until
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def record(self, name: str, started: float, ok: bool):
+        finished = time.perf_counter()
+        if not self.measure_from <= finished <= self.measure_until:
+            return
+        if ok:
+            self.latencies[name].append(finished - started)
+        else:
+            self.errors[name] += 1
+
+    def summary(self) -> dict:
+        elapsed = self.measure_until - self.measure_from
+        names = sorted(set(self.latencies) | set(self.errors))
+        return {name: report.summarize(self.latencies[name], self.errors[name], elapsed) for name in names}
+
+
+async def http_worker(client: httpx.AsyncClient, users: list, scenarios: dict, rng: random.Random, recorder: Recorder):
+    names = list(scenarios)
+    weights = [scenarios[name][0] for name in names]
+    while time.perf_counter() < recorder.measure_until:
+        name = rng.choices(names, weights)[0]
+        _, method, path, caller = scenarios[name]
+        user = rng.choice(users)
+        headers = {"Authorization": f"Bearer {user[caller + '_token']}"}
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, path.format(**user), headers=headers)
+            ok = response.status_code < 400
+        except httpx.HTTPError:
+            ok = False
+        recorder.record(name, started, ok)
+
+
+async def socket_worker(base_url: str, user: dict, recorder: Recorder, think_time: float):
+    sio = socketio.AsyncClient(reconnection=False)
+    try:
+        await sio.connect(base_url, auth={"token": user["client_token"]}, transports=["websocket"])
+        joined = await sio.call("join_room", user["room"])
+        if joined.get("status") != "ok":
+            raise RuntimeError(f"join_room refused: {joined}")
+        while time.perf_counter() < recorder.measure_until:
+            started = time.perf_counter()
+            try:
+                ack = await sio.call("send_message", {"room": user["room"], "text": "benchmark"}, timeout=10)
+                ok = ack.get("status") == "ok"
+            except socketio.exceptions.TimeoutError:
+                ok = False
+            recorder.record(SOCKET_SCENARIO, started, ok)
+            await asyncio.sleep(think_time)
+    except (socketio.exceptions.ConnectionError, RuntimeError) as e:
+        print(f"socket client {user['userid']}: {e}")
+        recorder.errors[SOCKET_SCENARIO] += 1
+    finally:
+        await sio.disconnect()
+
+
+async def run(args) -> dict:
+    users = await sample_users(args.users, seed=args.seed)
+    scenarios = {name: SCENARIOS[name] for name in args.scenarios} if args.scenarios else SCENARIOS
+
+    start = time.perf_counter()
+    recorder = Recorder(start + args.warmup, start + args.warmup + args.duration)
+    rng = random.Random(args.seed)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=30) as client:
+        workers = [
+            http_worker(client, users, scenarios, random.Random(rng.random()), recorder)
+            for _ in range(args.concurrency)
+        ]
+        workers += [
+            socket_worker(args.base_url, users[i % len(users)], recorder, args.socket_think_ms / 1000)
+            for i in range(args.socket_clients)
+        ]
+        await asyncio.gather(*workers)
+
+    config = {
+        "concurrency": args.concurrency,
+        "duration": args.duration,
+        "users": len(users),
+        "socket_clients": args.socket_clients,
+        "scenarios": sorted(scenarios),
+    }
+    return report.build_result("http", config, recorder.summary())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--concurrency", type=int, default=50, help="concurrent HTTP workers")
+    parser.add_argument("--duration", type=float, default=60, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=5, help="unmeasured seconds before")
+    parser.add_argument("--users", type=int, default=500, help="seeded clients to spread requests over")
+    parser.add_argument("--scenarios", type=lambda s: s.split(","), help=f"subset of: {','.join(SCENARIOS)}")
+    parser.add_argument("--socket-clients", type=int, default=20, help="Socket.IO senders alongside HTTP")
+    parser.add_argument("--socket-think-ms", type=float, default=100, help="pause between a sender's messages")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--save", help="write results as JSON (e.g. a new baseline)")
+    parser.add_argument("--compare", help="baseline JSON to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed p95 / throughput change")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    report.print_table(result["scenarios"])
+    if args.save:
+        report.save(result, args.save)
+    if args.compare:
+        regressions = report.compare(result, args.compare, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            raise SystemExit(1)
+        print(f"no regressions against {args.compare}")
+
+
+if __name__ == "__main__":
+    main()
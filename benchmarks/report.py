@@ -0,0 +1,93 @@
+"""Latency summaries, result files and baseline comparison shared by the load drivers."""
+import json
+import math
+import platform
+import subprocess
+from datetime import datetime, timezone
+
+# Below this many samples a p95 / p99 is too noisy to flag as a regression
+MIN_SAMPLES = 50
+
+
+def percentile(sorted_values: list, p: float) -> float:
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[max(math.ceil(p / 100 * len(sorted_values)) - 1, 0)]
+
+
+def summarize(latencies: list, errors: int, elapsed: float) -> dict:
+    """Per-scenario numbers from latencies in seconds over `elapsed` seconds of measurement."""
+    values = sorted(latencies)
+    return {
+        "requests": len(values),
+        "errors": errors,
+        "throughput": round(len(values) / elapsed, 2) if elapsed else 0.0,
+        "mean_ms": round(sum(values) / len(values) * 1000, 2) if values else 0.0,
+        "p50_ms": round(percentile(values, 50) * 1000, 2),
+        "p95_ms": round(percentile(values, 95) * 1000, 2),
+        "p99_ms": round(percentile(values, 99) * 1000, 2),
+        "max_ms": round(values[-1] * 1000, 2) if values else 0.0,
+    }
+
+
+def print_table(scenarios: dict, unit: str = "req/s"):
+    header = f"{'scenario':<28}{'count':>9}{'errors':>8}{unit:>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+    print(header)
+    print("-" * len(header))
+    for name, s in scenarios.items():
+        print(
+            f"{name:<28}{s['requests']:>9}{s['errors']:>8}{s['throughput']:>10.1f}"
+            f"{s['p50_ms']:>10.1f}{s['p95_ms']:>10.1f}{s['p99_ms']:>10.1f}"
+        )
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def build_result(kind: str, config: dict, scenarios: dict) -> dict:
+    return {
+        "kind": kind,
+        "recorded_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "host": {"python": platform.python_version(), "machine": platform.machine()},
+        "config": config,
+        "scenarios": scenarios,
+    }
+
+
+def save(result: dict, path: str):
+    with open(path, "w") as f:
+        json.dump(result, f, indent=2)
+        f.write("\n")
+    print(f"results written to {path}")
+
+
+def compare(result: dict, baseline_path: str, tolerance: float) -> list[str]:
+    """
+    Regressions against a stored baseline: p95 more than `tolerance` slower, or
+    throughput more than `tolerance` lower, for scenarios with enough samples.
+    """
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    if baseline.get("config") != result["config"]:
+        print("warning: baseline was recorded with a different configuration")
+
+    regressions = []
+    for name, base in baseline["scenarios"].items():
+        current = result["scenarios"].get(name)
+        if current is None or min(current["requests"], base["requests"]) < MIN_SAMPLES:
+            continue
+        if current["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {base['p95_ms']} -> {current['p95_ms']} ms")
+        if current["throughput"] < base["throughput"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {base['throughput']} -> {current['throughput']}")
+        if current["errors"] > base["errors"]:
+            regressions.append(f"{name}: errors {base['errors']} -> {current['errors']}")
+    return regressions
@@ -0,0 +1,200 @@
+"""
+Seed the configured database with synthetic benchmark data.
+
+    python -m benchmarks.seed [--nutritionists 1000] [--clients-per-nutritionist 20] [--days 180]
+    python -m benchmarks.seed --reset        # delete previously seeded rows only
+
+Every row is generated server-side with generate_series, so millions of rows
+take minutes, not hours. Seeded accounts use the @bench.wellthier.test domain;
+--reset removes exactly those (child rows go with them through ON DELETE
+CASCADE) and never touches real data. Random values are drawn after
+setseed(), so the same arguments produce the same data set.
+"""
+import argparse
+import asyncio
+import time
+
+from sqlalchemy import text
+
+from app.db.database import engine
+from app.scripts.backfill_login_activity import backfill
+
+DOMAIN = "bench.wellthier.test"
+CLIENT_EMAIL = f"bench-u%@{DOMAIN}"
+NUTRITIONIST_EMAIL = f"bench-n%@{DOMAIN}"
+
+_BENCH_ROOMS = """
+    SELECT 'chat_n' || r.nutritionist_id || '_u' || r.userid
+    FROM client_nutritionist_referral r JOIN userprofile p ON p.userid = r.userid
+    WHERE p.email LIKE :client_email
+"""
+
+# Chat tables are keyed by room / participant name, not foreign keys
+_RESET = [
+    text(f"DELETE FROM chat_message WHERE room IN ({_BENCH_ROOMS})"),
+    text(f"DELETE FROM chat_read_state WHERE room IN ({_BENCH_ROOMS})"),
+    text("DELETE FROM user_last_seen WHERE participant_id IN ("
+         " SELECT 'u' || userid FROM userprofile WHERE email LIKE :client_email"
+         " UNION ALL SELECT 'n' || nutritionistid FROM nutritionist WHERE email LIKE :nutritionist_email)"),
+    text("DELETE FROM userauthentication WHERE loginid LIKE :client_email"),
+    text("DELETE FROM nutritionist WHERE email LIKE :nutritionist_email"),
+]
+
+_NUTRITIONISTS = text(f"""
+    INSERT INTO nutritionist (name, email, password, professionaltitle, referralcode, is_active, account_status, created_at)
+    SELECT 'Bench Nutritionist ' || g, 'bench-n' || g || '@{DOMAIN}', 'x', 'Dietitian',
+           lpad(g::text, 6, '0'), true, 'active', CURRENT_DATE - 400
+    FROM generate_series(1, :n) AS g
+""")
+
+_AUTH = text(f"""
+    INSERT INTO userauthentication (loginid)
+    SELECT 'bench-u' || g || '@{DOMAIN}' FROM generate_series(1, :n) AS g
+""")
+
+_PROFILES = text("""
+    INSERT INTO userprofile (name, birthdate, gender, mobile, email, userauthenticationid, height, weight,
+                             startingweight, targetweight, lastlogin)
+    SELECT 'Bench Client ' || a.userauthenticationid,
+           DATE '1960-01-01' + (random() * 16000)::int,
+           CASE WHEN random() < 0.5 THEN 'female' ELSE 'male' END,
+           lpad((random() * 1e9)::bigint::text, 10, '9'),
+           a.loginid, a.userauthenticationid,
+           150 + random() * 45, 55 + random() * 50, 60 + random() * 50, 55 + random() * 30, now()
+    FROM userauthentication a
+    WHERE a.loginid LIKE :client_email
+""")
+
+# Client k (in userid order) is linked to nutritionist ((k - 1) % n) + 1
+_REFERRALS = text("""
+    WITH c AS (
+        SELECT userid, row_number() OVER (ORDER BY userid) AS k FROM userprofile WHERE email LIKE :client_email
+    ), n AS (
+        SELECT nutritionistid, row_number() OVER (ORDER BY nutritionistid) AS k, count(*) OVER () AS total
+        FROM nutritionist WHERE email LIKE :nutritionist_email
+    )
+    INSERT INTO client_nutritionist_referral (id, userid, nutritionist_id)
+    SELECT gen_random_uuid(), c.userid, n.nutritionistid
+    FROM c JOIN n ON n.k = (c.k - 1) % n.total + 1
+""")
+
+# One night per client per day, falling asleep between 21:00 and 01:00
+_SLEEP = text("""
+    INSERT INTO sleep_log (userid, start_time, end_time, duration_minutes, quality)
+    SELECT p.userid, s.start_time, s.start_time + make_interval(mins => s.minutes), s.minutes,
+           (ARRAY['good', 'average', 'poor'])[1 + (random() * 2)::int]
+    FROM userprofile p
+    CROSS JOIN generate_series(1, :days) AS d
+    CROSS JOIN LATERAL (
+        SELECT (CURRENT_DATE - d + TIME '21:00')::timestamptz + make_interval(mins => (random() * 240)::int) AS start_time,
+               300 + (random() * 240)::int AS minutes
+    ) s
+    WHERE p.email LIKE :client_email AND p.userid BETWEEN :lo AND :hi
+""")
+
+# Every other day, drifting around the profile weight
+_WEIGHT = text("""
+    INSERT INTO user_weight_log (userid, weight, unit, entry_date, created_at)
+    SELECT p.userid, round((p.weight + 3 * sin(d / 20.0) + random() - 0.5)::numeric, 2), 'kg',
+           CURRENT_DATE - d, (CURRENT_DATE - d + TIME '07:30')::timestamptz
+    FROM userprofile p
+    CROSS JOIN generate_series(0, :days - 1, 2) AS d
+    WHERE p.email LIKE :client_email AND p.userid BETWEEN :lo AND :hi
+""")
+
+# 0 .. 2 * logins_per_day logins a day at random hours
+_LOGINS = text("""
+    INSERT INTO user_login_history (userid, login_time, ip_address, user_agent)
+    SELECT p.userid, CURRENT_DATE - d + make_interval(secs => random() * 86399), '127.0.0.1', 'bench'
+    FROM userprofile p
+    CROSS JOIN generate_series(1, :days) AS d
+    CROSS JOIN LATERAL generate_series(1, (random() * 2 * :logins_per_day)::int) AS l
+    WHERE p.email LIKE :client_email AND p.userid BETWEEN :lo AND :hi
+""")
+
+_MESSAGES = text("""
+    INSERT INTO chat_message (id, room, sender_id, receiver_id, text, created_at)
+    SELECT gen_random_uuid(), 'chat_n' || r.nutritionist_id || '_u' || r.userid,
+           CASE WHEN m % 2 = 0 THEN 'u' || r.userid ELSE 'n' || r.nutritionist_id END,
+           CASE WHEN m % 2 = 0 THEN 'n' || r.nutritionist_id ELSE 'u' || r.userid END,
+           'Benchmark message ' || m,
+           now() - make_interval(mins => (:messages - m) * 30)
+    FROM client_nutritionist_referral r
+    JOIN userprofile p ON p.userid = r.userid
+    CROSS JOIN generate_series(1, :messages) AS m
+    WHERE p.email LIKE :client_email AND p.userid BETWEEN :lo AND :hi
+""")
+
+_TABLES = ["nutritionist", "userauthentication", "userprofile", "client_nutritionist_referral",
+           "sleep_log", "user_weight_log", "user_login_history", "user_login_activity", "chat_message"]
+
+_PATTERNS = {"client_email": CLIENT_EMAIL, "nutritionist_email": NUTRITIONIST_EMAIL}
+
+
+async def reset():
+    async with engine.begin() as conn:
+        for stmt in _RESET:
+            result = await conn.execute(stmt, _PATTERNS)
+            print(f"{stmt.text.split()[2]}: {result.rowcount} deleted")
+
+
+async def seed(args):
+    started = time.perf_counter()
+    clients = args.nutritionists * args.clients_per_nutritionist
+    async with engine.begin() as conn:
+        if await conn.scalar(text("SELECT 1 FROM nutritionist WHERE email LIKE :e LIMIT 1"), {"e": NUTRITIONIST_EMAIL}):
+            raise SystemExit("Benchmark data already present; run with --reset first")
+        await conn.execute(text("SELECT setseed(:seed)"), {"seed": args.seed})
+        await conn.execute(_NUTRITIONISTS, {"n": args.nutritionists})
+        await conn.execute(_AUTH, {"n": clients})
+        await conn.execute(_PROFILES, _PATTERNS)
+        await conn.execute(_REFERRALS, _PATTERNS)
+        lo, hi = (await conn.execute(
+            text("SELECT min(userid), max(userid) FROM userprofile WHERE email LIKE :client_email"), _PATTERNS
+        )).one()
+    print(f"{args.nutritionists} nutritionists, {clients} clients")
+
+    # Time series in chunks of clients, one transaction each
+    params = {**_PATTERNS, "days": args.days, "logins_per_day": args.logins_per_day, "messages": args.messages_per_room}
+    for chunk_lo in range(lo, hi + 1, args.chunk):
+        chunk = {**params, "lo": chunk_lo, "hi": min(chunk_lo + args.chunk - 1, hi)}
+        async with engine.begin() as conn:
+            await conn.execute(text("SELECT setseed(:seed)"), {"seed": args.seed})
+            for stmt in (_SLEEP, _WEIGHT, _LOGINS, _MESSAGES):
+                await conn.execute(stmt, chunk)
+        print(f"clients {chunk['lo']}..{chunk['hi']} done ({time.perf_counter() - started:.0f}s)")
+
+    # The dashboard reads the rollup, not the raw history
+    await backfill(None, chunk_days=30)
+
+    async with engine.begin() as conn:
+        for table in _TABLES:
+            await conn.execute(text(f"ANALYZE {table}"))
+            rows = await conn.scalar(text(f"SELECT reltuples::bigint FROM pg_class WHERE relname = '{table}'"))
+            print(f"{table}: ~{rows} rows")
+    print(f"seeded in {time.perf_counter() - started:.0f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--nutritionists", type=int, default=1000)
+    parser.add_argument("--clients-per-nutritionist", type=int, default=20)
+    parser.add_argument("--days", type=int, default=180, help="days of sleep / weight / login history per client")
+    parser.add_argument("--logins-per-day", type=float, default=1.0, help="average logins per client per day")
+    parser.add_argument("--messages-per-room", type=int, default=20)
+    parser.add_argument("--chunk", type=int, default=2000, help="clients per transaction")
+    parser.add_argument("--seed", type=float, default=0.42, help="setseed() value, -1 .. 1")
+    parser.add_argument("--reset", action="store_true", help="delete seeded rows and exit")
+    args = parser.parse_args()
+
+    async def run():
+        try:
+            await (reset() if args.reset else seed(args))
+        finally:
+            await engine.dispose()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
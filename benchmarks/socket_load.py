@@ -0,0 +1,240 @@
+"""
+Socket.IO load generator: many concurrent connections in chat rooms, measuring
+connect time, send_message ack latency and emit -> receive fan-out latency.
+
+    python -m benchmarks.socket_load [--base-url http://localhost:8000] [--rooms 500] [--devices 1]
+                                     [--topology pairs|hub] [--rate 200] [--duration 30]
+                                     [--save out.json] [--compare baseline.json]
+
+Rooms are seeded client-nutritionist links (python -m benchmarks.seed).
+Topologies:
+  pairs  every room has `devices` sockets of its client and `devices` of its
+         nutritionist, each in that room only (a chat screen per user)
+  hub    as pairs, but each nutritionist's sockets join all of its sampled rooms
+         (a dashboard listening to every client)
+
+Messages go out at --rate per second from a random socket of a random room,
+tagged with a client_msg_id that the server echoes in receive_message, so each
+delivery is timed against its emit on this process's clock. A delivery not
+seen within --drain seconds after the run counts as lost.
+
+Thousands of sockets need a high open-file limit (ulimit -n); one process
+tops out at a few thousand, so run several with different --seed values
+for more.
+"""
+import argparse
+import asyncio
+import itertools
+import random
+import resource
+import time
+from collections import defaultdict
+
+import socketio
+
+from benchmarks import report
+from benchmarks.users import sample_users
+
+
+class Connection:
+    def __init__(self, token: str, rooms: list):
+        self.token = token
+        self.rooms = rooms
+        self.sio = socketio.AsyncClient(reconnection=False)
+
+
+class FanoutStats:
+    def __init__(self):
+        self.sent = {}             # client_msg_id -> (emitted at, expected deliveries, measured)
+        self.received = defaultdict(int)
+        self.receive_latencies = []
+        self.ack_latencies = []
+        self.ack_errors = 0
+        self.connect_latencies = []
+        self.connect_errors = 0
+
+    def on_receive(self, data: dict):
+        sent = self.sent.get(data.get("client_msg_id"))
+        if sent is None:
+            return
+        emitted_at, _, measured = sent
+        self.received[data["client_msg_id"]] += 1
+        if measured:
+            self.receive_latencies.append(time.perf_counter() - emitted_at)
+
+    def lost(self) -> int:
+        return sum(
+            max(expected - self.received[msg_id], 0)
+            for msg_id, (_, expected, measured) in self.sent.items()
+            if measured
+        )
+
+
+def build_topology(users: list, topology: str, devices: int) -> list[Connection]:
+    connections = []
+    by_nutritionist = defaultdict(list)
+    for user in users:
+        connections += [Connection(user["client_token"], [user["room"]]) for _ in range(devices)]
+        by_nutritionist[user["nutritionist_id"]].append(user)
+    for rooms_users in by_nutritionist.values():
+        token = rooms_users[0]["nutritionist_token"]
+        if topology == "hub":
+            connections += [Connection(token, [u["room"] for u in rooms_users]) for _ in range(devices)]
+        else:
+            connections += [Connection(token, [u["room"]]) for u in rooms_users for _ in range(devices)]
+    return connections
+
+
+async def connect_all(base_url: str, connections: list, stats: FanoutStats, concurrency: int) -> list:
+    gate = asyncio.Semaphore(concurrency)
+
+    async def connect(conn: Connection):
+        async with gate:
+            conn.sio.on("receive_message", stats.on_receive)
+            started = time.perf_counter()
+            try:
+                await conn.sio.connect(base_url, auth={"token": conn.token}, transports=["websocket"])
+                for room in conn.rooms:
+                    joined = await conn.sio.call("join_room", room, timeout=30)
+                    if joined.get("status") != "ok":
+                        raise RuntimeError(f"join_room {room} refused: {joined}")
+            except (socketio.exceptions.ConnectionError, socketio.exceptions.TimeoutError, RuntimeError) as e:
+                stats.connect_errors += 1
+                if stats.connect_errors <= 5:
+                    print(f"connect failed: {e}")
+                return None
+            stats.connect_latencies.append(time.perf_counter() - started)
+            return conn
+
+    return [conn for conn in await asyncio.gather(*map(connect, connections)) if conn is not None]
+
+
+async def send(conn: Connection, room: str, msg_id: str, expected: int, measured: bool, stats: FanoutStats):
+    emitted_at = time.perf_counter()
+    stats.sent[msg_id] = (emitted_at, expected, measured)
+    try:
+        ack = await conn.sio.call("send_message", {"room": room, "text": "benchmark", "client_msg_id": msg_id}, timeout=10)
+        ok = ack.get("status") == "ok"
+    except (socketio.exceptions.TimeoutError, socketio.exceptions.BadNamespaceError):
+        ok = False
+    if not measured:
+        return
+    if ok:
+        stats.ack_latencies.append(time.perf_counter() - emitted_at)
+    else:
+        stats.ack_errors += 1
+
+
+async def run(args) -> dict:
+    users = await sample_users(args.rooms, seed=args.seed)
+    connections = build_topology(users, args.topology, args.devices)
+    _raise_open_files_limit(len(connections))
+
+    stats = FanoutStats()
+    print(f"connecting {len(connections)} sockets to {len(users)} rooms ({args.topology} topology)")
+    ramp_started = time.perf_counter()
+    connected = await connect_all(args.base_url, connections, stats, args.connect_concurrency)
+    ramp = time.perf_counter() - ramp_started
+    print(f"{len(connected)} connected in {ramp:.1f}s, {stats.connect_errors} failed")
+
+    members = defaultdict(list)
+    for conn in connected:
+        for room in conn.rooms:
+            members[room].append(conn)
+    rooms = sorted(members)
+    if not rooms:
+        raise SystemExit("No socket connected")
+
+    # Paced open loop: sends are not held back by slow acks
+    rng = random.Random(args.seed)
+    tasks = set()
+    start = time.perf_counter()
+    measure_from, measure_until = start + args.warmup, start + args.warmup + args.duration
+    for n in itertools.count():
+        due = start + n / args.rate
+        if due >= measure_until:
+            break
+        await asyncio.sleep(max(due - time.perf_counter(), 0))
+        room = rng.choice(rooms)
+        task = asyncio.create_task(send(
+            rng.choice(members[room]), room, f"m{n}", len(members[room]), due >= measure_from, stats,
+        ))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+    lag = time.perf_counter() - measure_until
+
+    await asyncio.sleep(args.drain)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*(conn.sio.disconnect() for conn in connected), return_exceptions=True)
+
+    measured = sum(1 for _, _, m in stats.sent.values() if m)
+    if lag > 1:
+        print(f"warning: sender fell {lag:.1f}s behind --rate; results understate the offered load")
+    scenarios = {
+        "connect_and_join": report.summarize(stats.connect_latencies, stats.connect_errors, ramp),
+        "send_message_ack": report.summarize(stats.ack_latencies, stats.ack_errors, args.duration),
+        "fanout_receive": report.summarize(stats.receive_latencies, stats.lost(), args.duration),
+    }
+    config = {
+        "rooms": len(users),
+        "topology": args.topology,
+        "devices": args.devices,
+        "sockets": len(connections),
+        "rate": args.rate,
+        "duration": args.duration,
+    }
+    result = report.build_result("socket", config, scenarios)
+    result["totals"] = {
+        "connected": len(connected),
+        "messages_sent": measured,
+        "messages_per_second": round(measured / args.duration, 2),
+        "deliveries": len(stats.receive_latencies),
+        "deliveries_per_second": round(len(stats.receive_latencies) / args.duration, 2),
+        "lost": stats.lost(),
+    }
+    return result
+
+
+def _raise_open_files_limit(sockets: int):
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    wanted = sockets + 256
+    if soft < wanted:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (min(wanted, hard), hard))
+        if hard < wanted:
+            print(f"warning: open-file limit {hard} is below the {wanted} needed for {sockets} sockets")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--rooms", type=int, default=500, help="seeded rooms to use")
+    parser.add_argument("--devices", type=int, default=1, help="sockets per participant")
+    parser.add_argument("--topology", choices=["pairs", "hub"], default="pairs")
+    parser.add_argument("--rate", type=float, default=200, help="messages per second, all rooms together")
+    parser.add_argument("--duration", type=float, default=30, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=5, help="unmeasured seconds of sending before")
+    parser.add_argument("--drain", type=float, default=3, help="seconds to wait for deliveries after sending stops")
+    parser.add_argument("--connect-concurrency", type=int, default=100, help="connections opened at once")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--save", help="write results as JSON (e.g. a new baseline)")
+    parser.add_argument("--compare", help="baseline JSON to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed p95 / throughput change")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    report.print_table(result["scenarios"], unit="per s")
+    print(", ".join(f"{key}={value}" for key, value in result["totals"].items()))
+    if args.save:
+        report.save(result, args.save)
+    if args.compare:
+        regressions = report.compare(result, args.compare, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            raise SystemExit(1)
+        print(f"no regressions against {args.compare}")
+
+
+if __name__ == "__main__":
+    main()
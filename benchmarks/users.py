@@ -0,0 +1,43 @@
+"""Seeded benchmark accounts, with JWTs minted locally (the server must share SECRET_KEY)."""
+import random
+
+from sqlalchemy import text
+
+from app.core.chat_auth import chat_room
+from app.core.security import create_access_token
+from app.db.database import engine
+from benchmarks.seed import CLIENT_EMAIL
+
+_SAMPLE = text("""
+    SELECT p.userid, p.userauthenticationid, p.email, r.nutritionist_id
+    FROM userprofile p
+    JOIN client_nutritionist_referral r ON r.userid = p.userid
+    WHERE p.email LIKE :client_email
+    ORDER BY p.userid
+""")
+
+
+async def sample_users(n: int, seed: int = 42) -> list[dict]:
+    """
+    `n` seeded clients (the same ones for the same seed), each with its
+    nutritionist, chat room and a token for both sides of the room.
+    """
+    async with engine.connect() as conn:
+        rows = (await conn.execute(_SAMPLE, {"client_email": CLIENT_EMAIL})).all()
+    await engine.dispose()
+    if not rows:
+        raise SystemExit("No benchmark users found; run python -m benchmarks.seed first")
+
+    picked = random.Random(seed).sample(rows, min(n, len(rows)))
+    return [
+        {
+            "userid": row.userid,
+            "nutritionist_id": row.nutritionist_id,
+            "room": chat_room(row.nutritionist_id, row.userid),
+            "client_token": create_access_token(
+                {"auth_id": str(row.userauthenticationid), "userid": str(row.userid), "email": row.email, "role": "CLIENT"}
+            ),
+            "nutritionist_token": create_access_token({"nutritionist_id": row.nutritionist_id}),
+        }
+        for row in picked
+    ]
@@ -1,6 +1,12 @@
+import os
 import socketio
 import time
 
+# JWT from /auth login (client or nutritionist) and a room it is linked to:
+#   TOKEN=... ROOM=chat_n<nutritionist_id>_u<userid> python test_socket.py
+TOKEN = os.environ["TOKEN"]
+ROOM = os.environ.get("ROOM", "chat_n1_u1")
+
 sio = socketio.Client()
 
 @sio.event
@@ -11,18 +17,16 @@ def connect():
 def receive_message(data):
     print("📩 Message received:", data)
 
-sio.connect("http://localhost:8000")
+sio.connect("http://localhost:8000", auth={"token": TOKEN})
 
 # Join room
-sio.emit("join_room", "chat_test")
+print("Join:", sio.call("join_room", ROOM))
 
 # Send message
 sio.emit("send_message", {
-    "room": "chat_test",
-    "sender_id": "python_test",
+    "room": ROOM,
     "text": "Hello from Python client"
 })
 
 time.sleep(5)
 sio.disconnect()
-